@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_cache():
+    """То же, что ``yatube.test_runner.TestRunner``, но для pytest."""
+    from posts import tiercache
+
+    with tiercache.isolated():
+        yield
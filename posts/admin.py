@@ -1,13 +1,91 @@
+from datetime import datetime
+
 from django.contrib import admin
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import search
+from .models import Group, Post, PostQuerySet
+from .paginator import ApproximateCountPaginator
+
+
+def next_period(date, kind):
+    if kind == 'year':
+        return date.replace(year=date.year + 1, month=1, day=1)
+    if kind == 'month':
+        if date.month == 12:
+            return date.replace(year=date.year + 1, month=1, day=1)
+        return date.replace(month=date.month + 1, day=1)
+    return date.fromordinal(date.toordinal() + 1)
+
 
-from .models import Group, Post
+class IndexedDatesQuerySet(PostQuerySet):
+    """``dates('pub_date', ...)`` без прохода по всей таблице.
+
+    ``date_hierarchy`` админки строит годы, месяцы и дни через
+    ``SELECT DISTINCT`` с функцией по каждой строке. Здесь каждое
+    следующее значение — ``MIN(pub_date)`` после начала следующего
+    периода, то есть один поиск по индексу на значение.
+    """
+
+    def aggregate(self, *args, **kwargs):
+        # MIN и MAX в одном запросе SQLite считает проходом по индексу,
+        # по отдельности — поиском с края индекса.
+        if args or len(kwargs) < 2 or not all(
+                isinstance(value, (Min, Max)) for value in kwargs.values()):
+            return super().aggregate(*args, **kwargs)
+        result = {}
+        for name, value in kwargs.items():
+            result.update(super().aggregate(**{name: value}))
+        return result
+
+    def dates(self, field_name, kind, order='ASC'):
+        if field_name != 'pub_date' or kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        queryset = self.order_by()
+        found = []
+        while True:
+            first = queryset.aggregate(first=Min('pub_date'))['first']
+            if first is None:
+                break
+            date = timezone.localtime(first).date()
+            if kind != 'day':
+                date = date.replace(day=1)
+            if kind == 'year':
+                date = date.replace(month=1)
+            found.append(date)
+            start = datetime.combine(next_period(date, kind),
+                                     datetime.min.time())
+            queryset = self.order_by().filter(
+                pub_date__gte=timezone.make_aware(start))
+        return found if order == 'ASC' else found[::-1]
 
 
 class PostAdmin(admin.ModelAdmin):
-    list_display = ("pk", "text", "pub_date", "author")
+    list_display = ("pk", "text", "pub_date", "author", "group")
+    list_select_related = ("author", "group")
     search_fields = ("text",)
+    # Варианты фильтра по дате постоянные (сегодня, неделя, месяц, год):
+    # отбор — диапазон по индексу pub_date.
     list_filter = ("pub_date",)
+    # Переход по годам и месяцам идёт по индексу pub_date.
+    date_hierarchy = "pub_date"
+    autocomplete_fields = ("author", "group")
     empty_value_display = "-пусто-"
+    paginator = ApproximateCountPaginator
+    # Без второго COUNT(*) по всей таблице.
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(model=queryset.model,
+                                    query=queryset.query, using=queryset.db)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Текст ищется по поисковому индексу, а не LIKE по всей таблице.
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search.matching(search_term)), False
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -15,6 +93,8 @@ class GroupAdmin(admin.ModelAdmin):
     search_fields = ("title", "description",)
     list_filter = ("title",)
     empty_value_display = "-пусто-"
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Post, PostAdmin)
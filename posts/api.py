@@ -0,0 +1,352 @@
+"""Read-only JSON API ``/api/v1/``: посты, группы, профили, комментарии
+и лента подписок.
+
+Ответы собираются из ``.values()``: строки базы сразу становятся
+словарями, модели не создаются. Параметры:
+
+* ``fields=id,text`` — только эти поля (``id`` есть всегда), и в SELECT
+  попадают только их столбцы;
+* ``include=author,group`` — связанные объекты вместо их id, тем же
+  запросом через JOIN;
+* ``cursor`` и ``limit`` — курсор по ключу списка, как у лент сайта:
+  без OFFSET и без COUNT. Адрес следующей страницы — в ``next``.
+
+Условный GET — по поколениям кеша страниц (``pagecache.validators``).
+Бюджеты запросов — ``METRICS_BUDGETS`` по именам адресов ``api_*``.
+"""
+import base64
+import binascii
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_safe
+
+from . import pagecache
+from .feed import HybridFeed
+from .models import Comment, Group, Post
+from .paginator import POST_KEYS, seek
+from .storage import image_storage
+
+User = get_user_model()
+
+MAX_LIMIT = 100
+COMMENT_KEYS = ('created', 'pk')
+GROUP_KEYS = ('slug', 'pk')
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class NotFound(Exception):
+    pass
+
+
+def _names(request, param, allowed):
+    raw = request.GET.get(param, '')
+    names = list(dict.fromkeys(
+        name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise BadRequest(f'{param}: неизвестные имена {", ".join(unknown)}')
+    return names
+
+
+class Resource:
+    """Поля ресурса: имя в ответе → столбец ``values()`` и преобразование
+    значения (или ``None``).
+
+    ``includes`` — имя → (связь, ресурс связанного объекта).
+    """
+
+    def __init__(self, fields, includes=None):
+        self.fields = fields
+        self.includes = includes or {}
+
+    def select(self, request):
+        """Поля и связи из ``fields`` и ``include`` запроса."""
+        fields = _names(request, 'fields', self.fields) or list(self.fields)
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+        return fields, _names(request, 'include', self.includes)
+
+    def columns(self, fields, includes):
+        columns = {self.fields[name][0] for name in fields
+                   if name not in includes}
+        for name in includes:
+            relation, resource = self.includes[name]
+            columns.update(f'{relation}__{column}'
+                           for column, _ in resource.fields.values())
+        return columns
+
+    def render(self, row, fields, includes):
+        item = {}
+        for name in fields:
+            if name not in includes:
+                column, convert = self.fields[name]
+                value = row[column]
+                item[name] = convert(value) if convert else value
+        for name in includes:
+            relation, resource = self.includes[name]
+            related = {key: row[f'{relation}__{column}']
+                       for key, (column, _) in resource.fields.items()}
+            item[name] = related if related['id'] is not None else None
+        return item
+
+
+USER = Resource({
+    'id': ('pk', None),
+    'username': ('username', None),
+    'first_name': ('first_name', None),
+    'last_name': ('last_name', None),
+})
+# Строка UserStats заводится лениво: у пользователя без постов и
+# подписок её может не быть, и счётчики тогда нулевые.
+PROFILE = Resource({
+    **USER.fields,
+    'posts_count': ('stats__posts_count', lambda count: count or 0),
+    'followers_count': ('stats__followers_count', lambda count: count or 0),
+    'following_count': ('stats__following_count', lambda count: count or 0),
+})
+GROUP = Resource({
+    'id': ('pk', None),
+    'slug': ('slug', None),
+    'title': ('title', None),
+    'description': ('description', None),
+})
+POST = Resource({
+    'id': ('pk', None),
+    'text': ('text', None),
+    'pub_date': ('pub_date', None),
+    'author': ('author_id', None),
+    'group': ('group_id', None),
+    'comment_count': ('comment_count', None),
+    'image': ('image', lambda name: image_storage.url(name) if name else None),
+    'thumbnail': ('thumbnail_url', lambda url: url or None),
+}, includes={'author': ('author', USER), 'group': ('group', GROUP)})
+COMMENT = Resource({
+    'id': ('pk', None),
+    'post': ('post_id', None),
+    'author': ('author_id', None),
+    'text': ('text', None),
+    'created': ('created', None),
+}, includes={'author': ('author', USER)})
+
+
+def encode_cursor(values):
+    # Не DjangoJSONEncoder: он обрезает микросекунды, а ключ должен быть
+    # точным.
+    raw = json.dumps(values, default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(request, model, keys):
+    """Позиция из ``cursor`` запроса в типах полей ключа ``keys``."""
+    token = request.GET.get('cursor')
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded).decode())
+        fields = [model._meta.pk if key == 'pk' else model._meta.get_field(key)
+                  for key in keys]
+        if len(values) != len(fields):
+            raise ValueError
+        return tuple(field.to_python(value)
+                     for field, value in zip(fields, values))
+    except (ValueError, TypeError, UnicodeError, binascii.Error,
+            ValidationError):
+        raise BadRequest('cursor: неверный курсор') from None
+
+
+def page_size(request):
+    try:
+        limit = int(request.GET.get('limit', settings.POSTS_PER_PAGE))
+    except ValueError:
+        raise BadRequest('limit: нужно целое число') from None
+    if not 1 <= limit <= MAX_LIMIT:
+        raise BadRequest(f'limit: от 1 до {MAX_LIMIT}')
+    return limit
+
+
+def respond(data, status=200):
+    return JsonResponse(data, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def listing(request, items, next_cursor):
+    next_url = None
+    if next_cursor is not None:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_url = f'{request.path}?{params.urlencode()}'
+    return respond({'results': items, 'next': next_url})
+
+
+def keyset(request, queryset, resource, keys, descending=True):
+    """Страница списка по курсору ``keys``: один запрос ``values()``."""
+    fields, includes = resource.select(request)
+    limit = page_size(request)
+    position = decode_cursor(request, queryset.model, keys)
+    columns = resource.columns(fields, includes) | set(keys)
+    rows = list(seek(queryset, keys, position, descending)
+                .values(*columns)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor([rows[limit - 1][key] for key in keys])
+    return listing(request,
+                   [resource.render(row, fields, includes)
+                    for row in rows[:limit]],
+                   next_cursor)
+
+
+def detail(request, queryset, resource):
+    fields, includes = resource.select(request)
+    row = queryset.values(*resource.columns(fields, includes)).first()
+    if row is None:
+        raise NotFound
+    return respond(resource.render(row, fields, includes))
+
+
+def api_view(scopes=None):
+    """Только GET/HEAD, ошибки JSON-ом, условный GET по ``scopes``.
+
+    ``scopes(request, **kwargs)`` — области кеша страниц, от которых
+    зависит ответ, или ``None``, если валидаторов нет.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                return view(request, *args, **kwargs)
+            except BadRequest as error:
+                return respond({'error': str(error)}, status=400)
+            except NotFound:
+                return respond({'error': 'Не найдено'}, status=404)
+
+        if scopes is not None:
+            def validators(request, *args, **kwargs):
+                # Вызывается дважды (ETag и Last-Modified): области
+                # могут стоить запроса, поэтому считаются один раз.
+                if not hasattr(request, '_api_scopes'):
+                    request._api_scopes = scopes(request, **kwargs)
+                if request._api_scopes is None:
+                    return None, None
+                return pagecache.validators(request, *request._api_scopes)
+
+            wrapper = condition(
+                etag_func=lambda *args, **kwargs:
+                    validators(*args, **kwargs)[0],
+                last_modified_func=lambda *args, **kwargs:
+                    validators(*args, **kwargs)[1],
+            )(wrapper)
+        return require_safe(wrapper)
+    return decorator
+
+
+def post_scopes(request, post_id):
+    username = (Post.objects.filter(pk=post_id)
+                .values_list('author__username', flat=True).first())
+    if username is None:
+        return [pagecache.INDEX]
+    return [pagecache.profile_scope(username)]
+
+
+def posts_scopes(request):
+    scopes = []
+    if request.GET.get('group'):
+        scopes.append(pagecache.group_scope(request.GET['group']))
+    if request.GET.get('author'):
+        scopes.append(pagecache.profile_scope(request.GET['author']))
+    return scopes or [pagecache.INDEX]
+
+
+def feed_scopes(request):
+    # Новые посты сбрасывают index, подписки — профиль читателя.
+    if not request.user.is_authenticated:
+        return None
+    return [pagecache.INDEX, pagecache.profile_scope(request.user.username)]
+
+
+@api_view(posts_scopes)
+def posts(request):
+    queryset = Post.objects.all()
+    if request.GET.get('group'):
+        queryset = queryset.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        queryset = queryset.filter(author__username=request.GET['author'])
+    return keyset(request, queryset, POST, POST_KEYS)
+
+
+@api_view(post_scopes)
+def post(request, post_id):
+    return detail(request, Post.objects.filter(pk=post_id), POST)
+
+
+@api_view(post_scopes)
+def comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise NotFound
+    return keyset(request, Comment.objects.filter(post_id=post_id), COMMENT,
+                  COMMENT_KEYS, descending=False)
+
+
+@api_view(lambda request: [pagecache.ALL])
+def groups(request):
+    return keyset(request, Group.objects.all(), GROUP, GROUP_KEYS,
+                  descending=False)
+
+
+@api_view(lambda request, slug: [pagecache.group_scope(slug)])
+def group(request, slug):
+    return detail(request, Group.objects.filter(slug=slug), GROUP)
+
+
+@api_view(lambda request, slug: [pagecache.group_scope(slug)])
+def group_posts(request, slug):
+    group_id = (Group.objects.filter(slug=slug)
+                .values_list('pk', flat=True).first())
+    if group_id is None:
+        raise NotFound
+    return keyset(request, Post.objects.filter(group_id=group_id), POST,
+                  POST_KEYS)
+
+
+@api_view(lambda request, username: [pagecache.profile_scope(username)])
+def profile(request, username):
+    return detail(request, User.objects.filter(username=username), PROFILE)
+
+
+@api_view(lambda request, username: [pagecache.profile_scope(username)])
+def profile_posts(request, username):
+    author_id = (User.objects.filter(username=username)
+                 .values_list('pk', flat=True).first())
+    if author_id is None:
+        raise NotFound
+    return keyset(request, Post.objects.filter(author_id=author_id), POST,
+                  POST_KEYS)
+
+
+@api_view(feed_scopes)
+def feed(request):
+    """Лента подписок: ключи из ``HybridFeed``, поля — одним запросом."""
+    if not request.user.is_authenticated:
+        return respond({'error': 'Нужно войти'}, status=401)
+    fields, includes = POST.select(request)
+    limit = page_size(request)
+    position = decode_cursor(request, Post, POST_KEYS)
+    keys = HybridFeed(request.user.pk).keys(position, limit=limit + 1)
+    ids = [pk for _, pk in keys[:limit]]
+    rows = {row['pk']: row for row in Post.objects.filter(pk__in=ids)
+            .values(*POST.columns(fields, includes) | {'pk'})}
+    next_cursor = None
+    if len(keys) > limit:
+        next_cursor = encode_cursor(list(keys[limit - 1]))
+    return listing(request,
+                   [POST.render(rows[pk], fields, includes)
+                    for pk in ids if pk in rows],
+                   next_cursor)
@@ -0,0 +1,19 @@
+from django.urls import path
+
+from . import api
+
+
+urlpatterns = [
+    path('posts/', api.posts, name='api_posts'),
+    path('posts/<int:post_id>/', api.post, name='api_post'),
+    path('posts/<int:post_id>/comments/', api.comments,
+         name='api_comments'),
+    path('groups/', api.groups, name='api_groups'),
+    path('groups/<slug:slug>/', api.group, name='api_group'),
+    path('groups/<slug:slug>/posts/', api.group_posts,
+         name='api_group_posts'),
+    path('profiles/<str:username>/', api.profile, name='api_profile'),
+    path('profiles/<str:username>/posts/', api.profile_posts,
+         name='api_profile_posts'),
+    path('feed/', api.feed, name='api_feed'),
+]
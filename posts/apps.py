@@ -1,9 +1,25 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def clear_object_cache(sender, **kwargs):
+    # После миграций схема закешированных моделей могла измениться, а
+    # тестовая база создаётся заново при том же файле кеша.
+    from . import objectcache
+    objectcache.clear()
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
 
+    def ready(self):
+        from . import db, signals  # noqa: F401
+        post_migrate.connect(clear_object_cache, sender=self)
+        connection_created.connect(db.configure_connection)
+        request_started.connect(db.check_connections)
+
 
 class GroupsConfig(AppConfig):
     name = 'groups'
@@ -0,0 +1,16 @@
+from django.contrib.auth.backends import ModelBackend
+
+from . import objectcache
+
+
+class CachedModelBackend(ModelBackend):
+    """``ModelBackend``, который берёт пользователя сессии из кеша объектов.
+
+    Запись сбрасывается сигналом при любом сохранении пользователя, в том
+    числе при смене пароля: хеш сессии сверяется уже с новым паролем, и
+    остальные сессии разлогиниваются, как и без кеша.
+    """
+
+    def get_user(self, user_id):
+        user = objectcache.session_users.get(user_id)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,279 @@
+"""Замеры всех адресов ``posts/urls.py`` тестовым клиентом.
+
+Каждый адрес запрашивается от имени самого активного автора: у него
+есть посты (правка, комментарий) и подписки (лента). Страницы
+авторизованных не кешируются, так что меряется сборка страницы, а не
+кеш. Первый запрос — прогрев и в статистику не входит. Запросы, которые
+пишут (подписка, комментарий), идут в транзакции с откатом, и данные
+между повторами не меняются.
+
+``concurrent`` — другой замер: читатели лент и писатели постов и
+комментариев одновременно, в отдельных процессах, на файловой базе.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from . import tiercache, urls
+from .models import Group, Post, UserStats
+
+PERCENTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+# Разница меньше этой (в мс) считается шумом, а не регрессией.
+NOISE_FLOOR = 1.0
+TOLERANCE = 0.2
+# Адреса, которые пишут в базу: замеряются в транзакции с откатом.
+WRITES = {'profile_follow', 'profile_unfollow', 'add_comment'}
+# Сессия и пользователь сессии: из базы на каждый запрос и из кеша.
+AUTH_SETUPS = {
+    'db': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': [
+            'django.contrib.auth.backends.ModelBackend'],
+    },
+    'cached': {
+        'SESSION_ENGINE': 'posts.sessions',
+        'AUTHENTICATION_BACKENDS': ['posts.backends.CachedModelBackend'],
+    },
+}
+AUTH_VIEWS = ('index', 'follow_index')
+
+
+@contextmanager
+def environment(file_db=False):
+    """Временная тестовая база, MEDIA_ROOT и свой кеш для замера.
+
+    Миграции тестовой базы и ``cache.clear()`` не трогают кеш сервера.
+    ``file_db`` — файловая база вместо базы в памяти: она нужна, когда
+    замер идёт в нескольких процессах.
+    """
+    directory = tempfile.mkdtemp()
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings['NAME']
+    old_name = connection.settings_dict['NAME']
+    if file_db:
+        test_settings['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    try:
+        with tiercache.isolated():
+            connection.creation.create_test_db(verbosity=0,
+                                               autoclobber=True)
+            try:
+                with override_settings(DEBUG=False, MEDIA_ROOT=directory):
+                    cache.clear()
+                    yield
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        test_settings['NAME'] = old_test_name
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[round(q * (len(ordered) - 1))]
+
+
+def targets():
+    """Метод, адрес и данные запроса для каждого имени из ``urls.py``."""
+    author = (UserStats.objects.select_related('user')
+              .order_by('-posts_count').first().user)
+    other = (UserStats.objects.exclude(user=author).select_related('user')
+             .order_by('-followers_count').first().user)
+    post = Post.objects.filter(author=author).latest('pub_date')
+    group = Group.objects.order_by('pk').first()
+    own = {'username': author.username}
+    own_post = {'username': author.username, 'post_id': post.pk}
+    plan = {
+        'index': ('get', {}, None),
+        'handler404': ('get', {}, None),
+        'handler500': ('get', {}, None),
+        'follow_index': ('get', {}, None),
+        'metrics': ('get', {}, None),
+        'search': ('get', {}, {'q': 'текст'}),
+        'profile_follow': ('get', {'username': other.username}, None),
+        'profile_unfollow': ('get', {'username': other.username}, None),
+        'group': ('get', {'slug': group.slug}, None),
+        'new_post': ('get', {}, None),
+        'profile': ('get', own, None),
+        'post': ('get', own_post, None),
+        'post_edit': ('get', own_post, None),
+        'add_comment': ('post', own_post, {'text': 'Комментарий'}),
+    }
+    names = [pattern.name for pattern in urls.urlpatterns]
+    unknown = set(names) - set(plan)
+    if unknown:
+        raise ValueError(f'Нет плана замера для {sorted(unknown)}: '
+                         'добавьте их в posts/benchmark.py')
+    return author, {
+        name: (method, reverse(name, kwargs=kwargs), data)
+        for name, (method, kwargs, data) in plan.items()
+    }
+
+
+def _request(client, method, url, data):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        try:
+            response = getattr(client, method)(url, data)
+            status = response.status_code
+        except Exception as error:
+            status = type(error).__name__
+        elapsed = time.perf_counter() - started
+    return elapsed, len(queries), status
+
+
+def measure(client, method, url, data, requests, writes=False):
+    latencies, counts = [], []
+    for attempt in range(requests + 1):
+        if not writes:
+            result = _request(client, method, url, data)
+        else:
+            with transaction.atomic():
+                result = _request(client, method, url, data)
+                transaction.set_rollback(True)
+        if attempt:
+            latencies.append(result[0] * 1000)
+            counts.append(result[1])
+    stats = {name: round(percentile(latencies, q), 3)
+             for name, q in PERCENTILES}
+    stats['queries'] = max(counts)
+    stats['status'] = result[2]
+    return stats
+
+
+def run(client, requests=20):
+    """Замеры всех адресов: ``{имя: {p50, p95, p99, queries, status}}``."""
+    author, plan = targets()
+    client.force_login(author)
+    # Ошибки видны в столбце status, трассировки в логе не нужны.
+    logger = logging.getLogger('django.request')
+    level = logger.level
+    logger.setLevel(logging.CRITICAL)
+    try:
+        return {name: measure(client, method, url, data, requests,
+                              writes=name in WRITES)
+                for name, (method, url, data) in plan.items()}
+    finally:
+        logger.setLevel(level)
+
+
+def compare_auth(user, requests=20):
+    """Замеры ``AUTH_VIEWS`` от имени ``user`` при каждой схеме из
+    ``AUTH_SETUPS``: ``{схема: {имя: {p50, p95, p99, queries, status}}}``.
+    """
+    results = {}
+    for setup, overrides in AUTH_SETUPS.items():
+        with override_settings(**overrides):
+            client = Client()
+            client.force_login(user)
+            results[setup] = {
+                name: measure(client, 'get', reverse(name), None, requests)
+                for name in AUTH_VIEWS}
+    return results
+
+
+def _latencies(samples):
+    stats = {name: round(percentile(samples, q), 3) if samples else None
+             for name, q in PERCENTILES}
+    stats['max'] = round(max(samples), 3) if samples else None
+    stats['count'] = len(samples)
+    return stats
+
+
+def _work(kind, client, plan, deadline, results):
+    samples, errors = [], 0
+    while time.perf_counter() < deadline:
+        for method, url, data in plan:
+            started = time.perf_counter()
+            try:
+                failed = getattr(client, method)(url, data).status_code >= 400
+            except Exception:
+                failed = True
+            samples.append((time.perf_counter() - started) * 1000)
+            errors += failed
+    connection.close()
+    results.put((kind, samples, errors))
+
+
+def concurrent(reader, writer, post, readers=4, writers=2, duration=5.0):
+    """Ленты ``index`` и ``follow_index`` от имени ``reader`` в ``readers``
+    процессах, пока ``writers`` процессов от имени ``writer`` публикуют
+    посты и комментируют его ``post``.
+
+    Процессы, а не потоки — как воркеры gunicorn: у каждого своё
+    соединение, и ожидание блокировок базы не прячется за GIL.
+    Возвращает задержки (мс) чтений и записей и число ошибок — ответов
+    4xx/5xx и исключений вроде ``database is locked``.
+    """
+    plans = {
+        'read': [('get', reverse('index'), None),
+                 ('get', reverse('follow_index'), None)],
+        'write': [('post', reverse('new_post'), {'text': 'Новый пост'}),
+                  ('post', reverse('add_comment', kwargs={
+                      'username': writer.username, 'post_id': post.pk}),
+                   {'text': 'Комментарий'})],
+    }
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = []
+    for kind, user, count in (('read', reader, readers),
+                              ('write', writer, writers)):
+        for _ in range(count):
+            client = Client()
+            client.force_login(user)
+            workers.append((kind, client))
+    # Соединение родителя не должно достаться детям.
+    connection.close()
+    deadline = time.perf_counter() + duration
+    processes = [context.Process(target=_work, args=(
+        kind, client, plans[kind], deadline, results))
+        for kind, client in workers]
+    logger = logging.getLogger('django.request')
+    level = logger.level
+    logger.setLevel(logging.CRITICAL)
+    try:
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        logger.setLevel(level)
+    summary = {}
+    for kind in plans:
+        samples = [sample for name, values, _ in collected if name == kind
+                   for sample in values]
+        summary[kind] = {
+            **_latencies(samples),
+            'errors': sum(errors for name, _, errors in collected
+                          if name == kind),
+        }
+    return summary
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Регрессии относительно ``baseline``: список строк."""
+    regressions = []
+    for scale, views in results.items():
+        for name, stats in views.items():
+            base = baseline.get(scale, {}).get(name)
+            if base is None:
+                continue
+            if stats['queries'] > base['queries']:
+                regressions.append(f'{scale} {name}: запросов '
+                                   f'{base["queries"]} → {stats["queries"]}')
+            limit = base['p95'] * (1 + tolerance)
+            if stats['p95'] > max(limit, base['p95'] + NOISE_FLOOR):
+                regressions.append(f'{scale} {name}: p95 '
+                                   f'{base["p95"]:.1f} → '
+                                   f'{stats["p95"]:.1f} мс')
+    return regressions
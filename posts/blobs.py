@@ -0,0 +1,142 @@
+"""Общие файлы картинок: дедупликация и подсчёт ссылок.
+
+``ImageBlob`` описывает файл из ``ContentAddressedStorage``: хеш исходной
+загрузки, манифест вариантов и число постов, которые ссылаются на файл.
+Повторная загрузка уже виденной картинки находится по хешу загрузки, и
+пост получает готовые файл и варианты — без пересжатия и нарезки.
+
+Ссылки считаются сигналами ``Post``, в том числе при каскадном удалении
+автора или группы. Когда на файл не ссылается ни один пост, файл и его
+варианты удаляются после фиксации транзакции. Файлы, загруженные до
+хранилища по хешу, не учитываются и не удаляются.
+"""
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from . import thumbnails
+from .models import ImageBlob, Post
+from .storage import content_digest, image_storage, is_hashed
+
+
+def _blob(name, upload_digest=''):
+    try:
+        with transaction.atomic():
+            blob, _ = ImageBlob.objects.get_or_create(
+                name=name, defaults={'upload_digest': upload_digest})
+    except IntegrityError:
+        blob = ImageBlob.objects.get(name=name)
+    if upload_digest and not blob.upload_digest:
+        blob.upload_digest = upload_digest
+        blob.save(update_fields=['upload_digest'])
+    return blob
+
+
+def _description(source):
+    return {field: getattr(source, field)
+            for field in thumbnails.DESCRIPTION_FIELDS}
+
+
+def prepare(post, rebuild=False):
+    """Готовит картинку ``post``: файл, варианты, размеры и заглушку.
+
+    ``rebuild`` заново режет варианты даже для уже виденного файла.
+    """
+    image = post.image
+    if not image:
+        thumbnails.apply(post, '', thumbnails.EMPTY_DESCRIPTION)
+        return
+    upload_digest = ''
+    if not image._committed:
+        upload_digest = content_digest(image.file)
+        seen = (ImageBlob.objects.filter(upload_digest=upload_digest)
+                .exclude(image_variants='').exclude(image_width=None).first())
+        if seen is not None:
+            post.image = seen.name
+            thumbnails.apply(post, seen.image_variants,
+                             _description(seen))
+            return
+        image.save(*thumbnails.clean_original(image), save=False)
+        # Поле получило новое имя: дальше читаем сохранённый файл.
+        image = post.image
+    # Старые файлы без хеша в имени описываются прямо в посте.
+    source = (_blob(image.name, upload_digest) if is_hashed(image.name)
+              else post)
+    changed = []
+    if rebuild or not source.image_variants:
+        # Прежние варианты могли лежать под другими именами.
+        thumbnails.delete_variants(source.image_variants)
+        source.image_variants = json.dumps(
+            thumbnails.render_variants(image))
+        changed.append('image_variants')
+    if rebuild or source.image_width is None:
+        for field, value in thumbnails.describe(image).items():
+            setattr(source, field, value)
+        changed.extend(thumbnails.DESCRIPTION_FIELDS)
+    if changed and source is not post:
+        source.save(update_fields=changed)
+    thumbnails.apply(post, source.image_variants, _description(source))
+
+
+def acquire(name):
+    """Пост начал ссылаться на файл ``name``."""
+    if not is_hashed(name):
+        return
+    updated = ImageBlob.objects.filter(name=name).update(
+        references=F('references') + 1)
+    if not updated:
+        try:
+            with transaction.atomic():
+                ImageBlob.objects.create(name=name, references=1)
+        except IntegrityError:
+            acquire(name)
+
+
+def release(name):
+    """Пост перестал ссылаться на файл ``name``; последний удаляет его."""
+    if not is_hashed(name):
+        return
+    with transaction.atomic():
+        ImageBlob.objects.filter(name=name).update(
+            references=F('references') - 1)
+        orphan = ImageBlob.objects.filter(name=name,
+                                          references__lte=0).first()
+        if orphan is None:
+            return
+        orphan.delete()
+    transaction.on_commit(lambda: _delete_files(orphan))
+
+
+def reconcile():
+    """Пересчитывает ссылки на файлы по таблице постов.
+
+    Нужна после записи постов в обход сигналов (загрузка): иначе удаление
+    соседнего поста с тем же файлом удалило бы файл, который ещё занят.
+    Возвращает число исправленных записей. Файлы без ссылок не удаляются.
+    """
+    counts = {name: total for name, total in
+              Post.objects.exclude(image='').exclude(image=None)
+              .order_by().values('image').annotate(total=Count('pk'))
+              .values_list('image', 'total')
+              if is_hashed(name)}
+    blobs = dict(ImageBlob.objects.values_list('name', 'references'))
+    missing = [ImageBlob(name=name, references=total)
+               for name, total in counts.items() if name not in blobs]
+    ImageBlob.objects.bulk_create(missing, batch_size=500,
+                                  ignore_conflicts=True)
+    fixed = len(missing)
+    for name, references in blobs.items():
+        total = counts.get(name, 0)
+        if total != references:
+            ImageBlob.objects.filter(name=name).update(references=total)
+            fixed += 1
+    return fixed
+
+
+def _delete_files(blob):
+    # Пока ждали фиксации, файл могли загрузить снова.
+    if ImageBlob.objects.filter(name=blob.name).exists():
+        return
+    image_storage.delete(blob.name)
+    thumbnails.delete_variants(blob.image_variants)
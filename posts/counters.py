@@ -0,0 +1,112 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Сигналы меняют счётчики атомарным ``UPDATE ... SET x = x + 1``, поэтому
+карточка автора и лента не считают строки. Строка ``UserStats`` заводится
+лениво: при первом обращении счётчики считаются по таблицам один раз.
+Удаления строку не создают — при каскадном удалении пользователя её
+некуда было бы привязать.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import objectcache
+from .models import Comment, Follow, Post, User, UserStats
+
+BATCH_SIZE = 500
+
+
+def actual_counts(user_id):
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def stats_for(user):
+    """Счётчики пользователя; при отсутствии строки она создаётся."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        pass
+    try:
+        with transaction.atomic():
+            stats = UserStats.objects.create(user=user,
+                                             **actual_counts(user.pk))
+    except IntegrityError:
+        stats = UserStats.objects.get(user=user)
+    user.stats = stats
+    return stats
+
+
+def change_user(user_id, create_missing=True, **deltas):
+    """Сдвигает счётчики пользователя на ``deltas``."""
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()})
+    if not updated and create_missing:
+        # Свежая строка считается по таблицам и уже учитывает изменение.
+        try:
+            with transaction.atomic():
+                UserStats.objects.create(user_id=user_id,
+                                         **actual_counts(user_id))
+        except IntegrityError:
+            change_user(user_id, create_missing=False, **deltas)
+
+
+def change_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta)
+
+
+def _count(queryset, field):
+    rows = (queryset.filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(total=Count('pk')).values('total'))
+    return Coalesce(Subquery(rows), 0)
+
+
+def _reconcile(queryset, counters):
+    """Чинит расхождения пачками по первичному ключу.
+
+    ``counters`` — словарь ``поле: выражение с фактическим значением``.
+    Возвращает число исправленных строк.
+    """
+    fixed = 0
+    last_pk = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).order_by('pk')
+                   .values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            return fixed
+        batch = queryset.filter(pk__gt=last_pk, pk__lte=pks[-1])
+        last_pk = pks[-1]
+        for field, actual in counters.items():
+            drifted = (batch.annotate(actual=actual)
+                       .exclude(**{field: F('actual')})
+                       .values_list('pk', flat=True))
+            with transaction.atomic():
+                fixed += queryset.filter(pk__in=list(drifted)).update(
+                    **{field: actual})
+
+
+def reconcile():
+    """Пересчитывает все счётчики; возвращает исправления по полям."""
+    missing = (User.objects.filter(stats__isnull=True)
+               .values_list('pk', flat=True))
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in missing.iterator()),
+        batch_size=500, ignore_conflicts=True)
+    fixed = {
+        'comment_count': _reconcile(Post.objects.all(), {
+            'comment_count': _count(Comment.objects, 'post'),
+        }),
+        'user_stats': _reconcile(UserStats.objects.all(), {
+            'posts_count': _count(Post.objects, 'author'),
+            'followers_count': _count(Follow.objects, 'author'),
+            'following_count': _count(Follow.objects, 'user'),
+        }),
+    }
+    if fixed['comment_count']:
+        # UPDATE идёт мимо сигналов: посты в кеше объектов устарели.
+        objectcache.clear()
+    return fixed
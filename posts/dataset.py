@@ -0,0 +1,130 @@
+"""Синтетический набор данных для нагрузочных замеров.
+
+Граф воспроизводим: одно и то же зерно даёт одни и те же записи.
+Авторство постов и популярность авторов распределены по степенному
+закону (вес автора ранга ``r`` — ``r ** -POWER``): немногие пишут и
+собирают подписчиков больше всех, как в живой соцсети. Записи идут в
+``importer.Importer``, так что генерация пишет в базу тем же быстрым
+путём, что и ``import_yatube``.
+
+Картинки — небольшой пул разных изображений, прогнанных через обычный
+конвейер (``blobs.prepare``); посты ссылаются на файлы пула.
+"""
+import random
+from bisect import bisect
+from datetime import datetime, timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from . import blobs, objectcache, thumbnails
+from .importer import Importer
+from .models import ImageBlob, Post
+
+POWER = 1.1
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+SPAN = timedelta(days=365)
+
+
+class PowerLaw:
+    """Выбор номера от 0 до ``size - 1`` с весом ``(номер + 1) ** -power``."""
+
+    def __init__(self, size, rnd, power=POWER):
+        self.rnd = rnd
+        self.cumulative = list(accumulate(
+            (rank + 1) ** -power for rank in range(size)))
+
+    def __call__(self):
+        return bisect(self.cumulative,
+                      self.rnd.random() * self.cumulative[-1])
+
+
+def make_images(count, rnd):
+    """Готовит ``count`` картинок; возвращает имена файлов и поля постов."""
+    pool = []
+    for _ in range(count):
+        color = tuple(rnd.randrange(256) for _ in range(3))
+        size = (rnd.randrange(400, 1600), rnd.randrange(300, 1200))
+        content = BytesIO()
+        Image.new('RGB', size, color).save(content, 'png')
+        post = Post(image=SimpleUploadedFile('dataset.png',
+                                             content.getvalue()))
+        blobs.prepare(post)
+        pool.append((post.image.name,
+                     {field: getattr(post, field)
+                      for field in thumbnails.FIELDS}))
+    return pool
+
+
+class Dataset:
+    def __init__(self, users=100, groups=10, posts=1000, comments=None,
+                 follows=20, images=0, image_share=0.2, seed=1,
+                 prefix='user'):
+        self.rnd = random.Random(seed)
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.comments = posts if comments is None else comments
+        self.follows = follows
+        self.images = images
+        self.image_share = image_share
+        self.prefix = prefix
+        self.first_post_id = (Post.objects.aggregate(last=Max('pk'))['last']
+                              or 0) + 1
+
+    def username(self, number):
+        return f'{self.prefix}_{number}'
+
+    def records(self, image_names=()):
+        rnd = self.rnd
+        for number in range(self.users):
+            yield {'type': 'user', 'username': self.username(number)}
+        for number in range(self.groups):
+            yield {'type': 'group', 'slug': f'{self.prefix}-group-{number}',
+                   'title': f'Группа {number}', 'description': 'Описание'}
+        author = PowerLaw(self.users, rnd)
+        step = SPAN / max(self.posts, 1)
+        for number in range(self.posts):
+            group = rnd.randrange(self.groups * 2) if self.groups else None
+            image = None
+            if image_names and rnd.random() < self.image_share:
+                image = rnd.choice(image_names)
+            yield {'type': 'post', 'id': self.first_post_id + number,
+                   'author': self.username(author()),
+                   # Половина постов без группы.
+                   'group': (f'{self.prefix}-group-{group}'
+                             if group is not None and group < self.groups
+                             else None),
+                   'text': f'Пост {number} ' + 'текст ' * rnd.randrange(50),
+                   'pub_date': (START + step * number).isoformat(),
+                   'image': image}
+        # Свежие посты обсуждают чаще.
+        recent = PowerLaw(self.posts, rnd)
+        for number in range(self.comments if self.posts else 0):
+            yield {'type': 'comment',
+                   'post': self.first_post_id + self.posts - 1 - recent(),
+                   'author': self.username(rnd.randrange(self.users)),
+                   'text': f'Комментарий {number}'}
+        popular = PowerLaw(self.users, rnd)
+        for number in range(self.users):
+            authors = {popular() for _ in range(self.follows)} - {number}
+            for followed in sorted(authors):
+                yield {'type': 'follow', 'user': self.username(number),
+                       'author': self.username(followed)}
+
+    def load(self, stdout=None):
+        """Пишет набор в базу; возвращает счётчики ``Importer``."""
+        pool = make_images(self.images, self.rnd)
+        loader = Importer(stdout=stdout)
+        loader.run(self.records([name for name, _ in pool]))
+        loader.finish()
+        # Поля картинок и ссылки на файлы — одним UPDATE на файл пула.
+        for name, fields in pool:
+            references = Post.objects.filter(image=name).update(**fields)
+            ImageBlob.objects.filter(name=name).update(references=references)
+        objectcache.clear()
+        return loader.written
@@ -0,0 +1,49 @@
+"""Настройка соединений SQLite для боевого режима.
+
+Каждое новое соединение получает PRAGMA из ``SQLITE_PRAGMAS``: журнал
+WAL (читатели не ждут писателя, а писатель — читателей),
+``synchronous=NORMAL`` (в WAL без потери целостности, fsync только на
+контрольных точках), ``mmap_size`` и ``cache_size`` для чтения без
+лишних системных вызовов и ``busy_timeout``: писатели ждут друг друга,
+а не падают с ``database is locked``.
+
+Соединения живут ``CONN_MAX_AGE`` секунд. Перед каждым запросом
+постоянное соединение проверяется ``SELECT 1`` прямо на драйвере (мимо
+счётчиков запросов); сломанное закрывается, и Django откроет новое.
+"""
+import sqlite3
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик ``connection_created``: PRAGMA для SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def check_connection(connection):
+    """Закрывает соединение, если оно больше не отвечает."""
+    if connection.connection is None or connection.in_atomic_block:
+        return
+    if connection.vendor == 'sqlite':
+        try:
+            connection.connection.execute('SELECT 1')
+            return
+        except sqlite3.Error:
+            pass
+    elif connection.is_usable():
+        return
+    try:
+        connection.close()
+    except DatabaseError:
+        connection.connection = None
+
+
+def check_connections(**kwargs):
+    """Обработчик ``request_started``."""
+    for connection in connections.all():
+        check_connection(connection)
@@ -0,0 +1,128 @@
+"""Потоковая выгрузка данных в JSON Lines для ``import_yatube``.
+
+Таблицы читаются кусками по первичному ключу (``pk > последний``), а не
+смещением: каждый кусок — короткий запрос по индексу, который целиком
+забирается из базы до записи в выход. Между кусками база свободна, так
+что долгой блокировки чтения SQLite нет, а память ограничена размером
+куска.
+
+Картинки постов по желанию складываются в tar-поток. Файлы хранилища по
+хешу перечисляются по ``ImageBlob`` (каждый один раз), старые файлы —
+вместе со своими постами. Пароли пользователей не выгружаются.
+"""
+import json
+import tarfile
+
+from .models import Comment, Follow, Group, ImageBlob, Post, User
+from .storage import image_storage, is_hashed
+
+CHUNK_SIZE = 2000
+
+
+def chunks(queryset, fields, chunk_size=CHUNK_SIZE):
+    """Строки ``queryset`` словарями, кусками по возрастанию ``pk``."""
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).order_by('pk')
+                    .values('pk', *fields)[:chunk_size])
+        if not rows:
+            return
+        last_pk = rows[-1]['pk']
+        yield rows
+
+
+def _date(value):
+    return value.isoformat() if value else None
+
+
+def users(chunk_size=CHUNK_SIZE):
+    fields = ('username', 'first_name', 'last_name', 'email')
+    for rows in chunks(User.objects.all(), fields, chunk_size):
+        for row in rows:
+            yield {'type': 'user', **{field: row[field] for field in fields}}
+
+
+def groups(chunk_size=CHUNK_SIZE):
+    fields = ('slug', 'title', 'description')
+    for rows in chunks(Group.objects.all(), fields, chunk_size):
+        for row in rows:
+            yield {'type': 'group', **{field: row[field] for field in fields}}
+
+
+def posts(chunk_size=CHUNK_SIZE):
+    fields = ('author__username', 'group__slug', 'text', 'pub_date', 'image')
+    for rows in chunks(Post.objects.all(), fields, chunk_size):
+        for row in rows:
+            yield {'type': 'post', 'id': row['pk'],
+                   'author': row['author__username'],
+                   'group': row['group__slug'], 'text': row['text'],
+                   'pub_date': _date(row['pub_date']),
+                   'image': row['image'] or None}
+
+
+def comments(chunk_size=CHUNK_SIZE):
+    fields = ('post_id', 'author__username', 'text', 'created')
+    for rows in chunks(Comment.objects.all(), fields, chunk_size):
+        for row in rows:
+            yield {'type': 'comment', 'post': row['post_id'],
+                   'author': row['author__username'], 'text': row['text'],
+                   'created': _date(row['created'])}
+
+
+def follows(chunk_size=CHUNK_SIZE):
+    fields = ('user__username', 'author__username')
+    for rows in chunks(Follow.objects.all(), fields, chunk_size):
+        for row in rows:
+            yield {'type': 'follow', 'user': row['user__username'],
+                   'author': row['author__username']}
+
+
+# Порядок зависимостей: импорт читает записи подряд.
+SECTIONS = (users, groups, posts, comments, follows)
+
+
+def records(chunk_size=CHUNK_SIZE):
+    for section in SECTIONS:
+        yield from section(chunk_size)
+
+
+def media_names(chunk_size=CHUNK_SIZE):
+    """Имена файлов картинок постов, каждое по одному разу."""
+    for rows in chunks(ImageBlob.objects.filter(references__gt=0),
+                       ('name',), chunk_size):
+        for row in rows:
+            yield row['name']
+    legacy = Post.objects.exclude(image='').exclude(image__isnull=True)
+    for rows in chunks(legacy, ('image',), chunk_size):
+        for row in rows:
+            if not is_hashed(row['image']):
+                yield row['image']
+
+
+def write_jsonl(stream, chunk_size=CHUNK_SIZE):
+    """Пишет все записи в текстовый ``stream``; возвращает их число."""
+    total = 0
+    for record in records(chunk_size):
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        total += 1
+    return total
+
+
+def write_media(fileobj, chunk_size=CHUNK_SIZE):
+    """Пишет картинки в tar-поток ``fileobj``.
+
+    Возвращает число добавленных и отсутствующих в хранилище файлов.
+    """
+    added = missing = 0
+    with tarfile.open(fileobj=fileobj, mode='w|') as archive:
+        for name in media_names(chunk_size):
+            if not image_storage.exists(name):
+                missing += 1
+                continue
+            info = tarfile.TarInfo(name)
+            info.size = image_storage.size(name)
+            info.mtime = image_storage.get_modified_time(name).timestamp()
+            with image_storage.open(name) as content:
+                archive.addfile(info, content)
+            added += 1
+    return added, missing
@@ -0,0 +1,127 @@
+"""Гибридная лента подписок: push для обычных авторов, pull для популярных.
+
+Посты авторов в pull-режиме (``UserStats.feed_pulled``) не раскладываются
+по лентам (иначе один пост — сотни тысяч вставок), а читаются при показе
+ленты прямо из ``Post`` по индексу автора. Остальные посты берутся из
+материализованной ленты ``TimelineEntry``. Все потоки уже отсортированы
+по ``(pub_date, id)`` и сливаются кучей (k-way merge).
+
+Автор переходит в pull-режим сразу, как только подписчиков становится не
+меньше ``FEED_PULL_THRESHOLD`` (``timeline.follower_added``). Обратно —
+только командой ``manage.py sync_feed_modes``: посты, вышедшие в
+pull-режиме, в ленты не попадали, и команда дописывает их подписчикам.
+До этого автор читается по-прежнему, поэтому посты из ленты не пропадают.
+После сверки счётчиков или смены порога нужна та же команда.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginator import (POST_KEYS, CursorPaginator, numbered_page,
+                        seek)
+
+# Ключ курсора для записей ленты: дата поста и id поста.
+TIMELINE_KEYS = ('pub_date', 'post_id')
+PULLED_KEY = 'feed:pulled'
+
+
+def post_key(post):
+    return post.pub_date, post.pk
+
+
+def pulled_authors():
+    """Множество id авторов, чьи посты читаются в pull-режиме.
+
+    Берётся по индексу ``UserStats.feed_pulled`` и кешируется на
+    ``FEED_PULL_REFRESH`` секунд. Смена режима сбрасывает кеш
+    (``forget_pulled``).
+    """
+    authors = cache.get(PULLED_KEY)
+    if authors is None:
+        authors = frozenset(UserStats.objects.filter(feed_pulled=True)
+                            .values_list('user_id', flat=True))
+        cache.set(PULLED_KEY, authors, settings.FEED_PULL_REFRESH)
+    return authors
+
+
+def forget_pulled():
+    cache.delete(PULLED_KEY)
+
+
+class HybridFeed:
+    """Лента пользователя как упорядоченная последовательность постов.
+
+    Годится и для ``Paginator`` (``count()`` и срезы, глубина ограничена
+    ``PAGINATOR_COUNT_LIMIT``), и для ``FeedPaginator`` (``rows()``).
+    """
+    ordered = True
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        followed = (Follow.objects.filter(user_id=user_id)
+                    .values_list('author_id', flat=True))
+        self.pulled = sorted(pulled_authors().intersection(followed))
+        self.truncated = False
+
+    def _timeline(self):
+        entries = TimelineEntry.objects.filter(user_id=self.user_id)
+        if self.pulled:
+            entries = entries.exclude(author_id__in=self.pulled)
+        return entries
+
+    def _streams(self, position, descending, limit):
+        entries = self._timeline().select_related('post__author',
+                                                  'post__group')
+        entries = seek(entries, TIMELINE_KEYS, position, descending)[:limit]
+        yield (entry.post for entry in entries)
+        for author_id in self.pulled:
+            posts = Post.objects.for_feed().filter(author_id=author_id)
+            yield seek(posts, POST_KEYS, position, descending)[:limit]
+
+    def rows(self, position=None, descending=True, limit=None):
+        """Первые ``limit`` постов ленты после ``position``."""
+        merged = heapq.merge(*self._streams(position, descending, limit),
+                             key=post_key, reverse=descending)
+        return list(islice(merged, limit))
+
+    def keys(self, position=None, descending=True, limit=None):
+        """Как ``rows``, но только ключи ``(pub_date, id)``, без моделей."""
+        entries = seek(self._timeline(), TIMELINE_KEYS, position, descending)
+        streams = [entries.values_list(*TIMELINE_KEYS)[:limit]]
+        for author_id in self.pulled:
+            posts = seek(Post.objects.filter(author_id=author_id), POST_KEYS,
+                         position, descending)
+            streams.append(posts.values_list(*POST_KEYS)[:limit])
+        return list(islice(heapq.merge(*streams, reverse=descending), limit))
+
+    def count(self):
+        limit = settings.PAGINATOR_COUNT_LIMIT
+        total = self._timeline()[:limit + 1].count()
+        if self.pulled:
+            total += (Post.objects.filter(author_id__in=self.pulled)
+                      [:limit + 1].count())
+        self.truncated = total > limit
+        return min(total, limit)
+
+    def __getitem__(self, key):
+        return self.rows(limit=key.stop)[key]
+
+
+class FeedPaginator(CursorPaginator):
+    """Курсорный пагинатор поверх ``HybridFeed``."""
+
+    def _rows(self, position=None, descending=True):
+        return self.object_list.rows(position, descending, self.per_page + 1)
+
+
+def feed_page(request, user):
+    """Страница ленты подписок ``user`` для запроса."""
+    feed = HybridFeed(user.pk)
+    per_page = settings.POSTS_PER_PAGE
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        return FeedPaginator(feed, per_page).get_page(cursor)
+    return numbered_page(feed, per_page, request.GET.get('page'))
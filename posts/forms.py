@@ -1,5 +1,6 @@
 from django import forms
 
+from . import blobs, thumbnails
 from .models import Post, Comment
 
 
@@ -11,6 +12,22 @@ class PostForm(forms.ModelForm):
 
         return data
 
+    def save(self, commit=True):
+        image_changed = 'image' in self.changed_data
+        if image_changed:
+            blobs.prepare(self.instance)
+        if not commit or self.instance._state.adding:
+            return super().save(commit)
+        # Правка пишет только свои поля: comment_count экземпляра из кеша
+        # объектов мог устареть.
+        fields = list(self._meta.fields)
+        if image_changed:
+            fields.extend(thumbnails.FIELDS)
+        post = super().save(commit=False)
+        post.save(update_fields=fields)
+        self._save_m2m()
+        return post
+
     class Meta:
         model = Post
         fields = ['group', 'text', 'image']
@@ -0,0 +1,273 @@
+"""Потоковая загрузка пользователей, групп, постов, комментариев и подписок.
+
+Вход — JSON Lines (одна запись на строку, тип в поле ``type``) или CSV с
+заголовком (тип задаётся для всего файла). Записи копятся в буферах и
+пишутся пачками ``bulk_create``; каждая пачка — своя транзакция, так что
+память не растёт с размером файла, а упавшая загрузка оставляет целые
+пачки. Имена пользователей и адреса групп переводятся в id через словари
+в памяти, посты ссылаются друг на друга по явному ``id``.
+
+``bulk_create`` обходит сигналы, поэтому счётчики, ленты подписок, кеш
+страниц и кеш объектов обновляются один раз в конце:
+``counters.reconcile``, ``blobs.reconcile`` (ссылки на общие файлы
+картинок), режимы лент авторов и ``timeline.rebuild``, сброс поколения
+``pagecache.ALL`` и ``objectcache.clear``. Индекс FTS5 поиска обновляют
+триггеры базы, запасной — ``search.rebuild``.
+
+Поля записей:
+
+* ``user``: ``username``, ``first_name``, ``last_name``, ``email``;
+* ``group``: ``slug``, ``title``, ``description``;
+* ``post``: ``id``, ``author``, ``group``, ``text``, ``pub_date``, ``image``;
+* ``comment``: ``post`` (id поста), ``author``, ``text``, ``created``;
+* ``follow``: ``user``, ``author``.
+"""
+import csv
+import gzip
+import io
+import json
+import sys
+from datetime import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import blobs, counters, objectcache, pagecache, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+TYPES = ('user', 'group', 'post', 'comment', 'follow')
+BATCH_SIZE = 5000
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def open_input(path):
+    """Текстовый поток файла; ``-`` — стандартный ввод, ``.gz`` — gzip."""
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            raise InvalidRecord(f'строка {number}: {error}') from None
+
+
+def read_csv(stream, record_type):
+    for row in csv.DictReader(stream):
+        row.setdefault('type', record_type)
+        yield row
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            date = parse_datetime(value)
+        except ValueError:
+            date = None
+    if date is None:
+        raise InvalidRecord(f'неверная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+def insert_rows(model, rows, ignore_conflicts=False):
+    """Вставляет словари ``rows`` одним ``executemany``; возвращает число
+    вставленных строк (без пропущенных ``ignore_conflicts``).
+
+    Модели не создаются и SQL не собирается на каждую пачку: на
+    миллионах строк это основная часть времени ``bulk_create``. У всех
+    словарей одинаковые ключи — ``attname`` полей; остальные поля
+    получают значения по умолчанию. ``pre_save`` полей не вызывается,
+    поэтому ``auto_now_add`` не перетирает даты из файла.
+    """
+    if not rows:
+        return 0
+    provided = rows[0].keys()
+    fields = [field for field in model._meta.concrete_fields
+              if field.attname in provided or not field.primary_key]
+    # Значения по умолчанию готовятся для базы один раз на пачку.
+    defaults = {field.attname: field.get_db_prep_save(field.get_default(),
+                                                      connection)
+                for field in fields if field.attname not in provided}
+    ops = connection.ops
+    sql = '{} {} ({}) VALUES ({}){}'.format(
+        ops.insert_statement(ignore_conflicts=ignore_conflicts),
+        ops.quote_name(model._meta.db_table),
+        ', '.join(ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+        ops.ignore_conflicts_suffix_sql(ignore_conflicts=ignore_conflicts))
+    prepared = [field for field in fields if field.attname in provided]
+    params = []
+    for row in rows:
+        values = dict(defaults)
+        for field in prepared:
+            values[field.attname] = field.get_db_prep_save(
+                row[field.attname], connection)
+        params.append([values[field.attname] for field in fields])
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+        return cursor.rowcount
+
+
+class Importer:
+    def __init__(self, batch_size=BATCH_SIZE, stdout=None):
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.buffers = {record_type: [] for record_type in TYPES}
+        self.written = dict.fromkeys(TYPES, 0)
+        self.skipped = dict.fromkeys(TYPES, 0)
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+
+    def run(self, records):
+        for record in records:
+            record_type = record.get('type')
+            if record_type not in self.buffers:
+                raise InvalidRecord(
+                    f'неизвестный тип записи {record_type!r}')
+            buffer = self.buffers[record_type]
+            buffer.append(record)
+            if len(buffer) >= self.batch_size:
+                self.flush()
+        self.flush()
+        return self.written
+
+    def flush(self):
+        """Пишет все буферы одной транзакцией.
+
+        Порядок типов — порядок зависимостей: пост из той же пачки уже
+        видит своего автора, комментарий — свой пост.
+        """
+        with transaction.atomic():
+            for record_type in TYPES:
+                records = self.buffers[record_type]
+                if records:
+                    getattr(self, f'write_{record_type}s')(records)
+                    records.clear()
+        if self.stdout is not None:
+            self.stdout.write(' '.join(f'{record_type}={count}'
+                                       for record_type, count
+                                       in self.written.items()))
+
+    def resolve(self, mapping, key, record_type):
+        pk = mapping.get(key)
+        if pk is None:
+            self.skipped[record_type] += 1
+        return pk
+
+    def write_users(self, records):
+        users = [User(username=record['username'],
+                      first_name=record.get('first_name') or '',
+                      last_name=record.get('last_name') or '',
+                      email=record.get('email') or '',
+                      password=make_password(None))
+                 for record in records
+                 if record['username'] not in self.users]
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        # SQLite не возвращает id из bulk_create: перечитываем.
+        self.users.update(User.objects.filter(
+            username__in=[user.username for user in users])
+            .values_list('username', 'pk'))
+        self.written['user'] += len(users)
+
+    def write_groups(self, records):
+        groups = [Group(slug=record['slug'], title=record['title'],
+                        description=record.get('description') or '')
+                  for record in records if record['slug'] not in self.groups]
+        Group.objects.bulk_create(groups, ignore_conflicts=True)
+        self.groups.update(Group.objects.filter(
+            slug__in=[group.slug for group in groups])
+            .values_list('slug', 'pk'))
+        self.written['group'] += len(groups)
+
+    def write_posts(self, records):
+        # Посты с явным id и без него — разные наборы столбцов.
+        posts = {True: [], False: []}
+        for record in records:
+            author_id = self.resolve(self.users, record['author'], 'post')
+            if author_id is None:
+                continue
+            group_id = None
+            if record.get('group'):
+                group_id = self.resolve(self.groups, record['group'], 'post')
+                if group_id is None:
+                    continue
+            post = {'author_id': author_id, 'group_id': group_id,
+                    'text': record['text'],
+                    'pub_date': parse_date(record.get('pub_date')),
+                    'image': record.get('image') or None}
+            if record.get('id'):
+                post['id'] = int(record['id'])
+            posts['id' in post].append(post)
+        for rows in posts.values():
+            self.written['post'] += insert_rows(Post, rows,
+                                                ignore_conflicts=True)
+
+    def write_comments(self, records):
+        # Один запрос на пачку вместо падения транзакции на внешнем ключе.
+        posts = set(Post.objects.filter(
+            pk__in={int(record['post']) for record in records})
+            .values_list('pk', flat=True))
+        comments = []
+        for record in records:
+            post_id = int(record['post'])
+            if post_id not in posts:
+                self.skipped['comment'] += 1
+                continue
+            author_id = self.resolve(self.users, record['author'],
+                                     'comment')
+            if author_id is None:
+                continue
+            comments.append({'post_id': post_id, 'author_id': author_id,
+                             'text': record['text'],
+                             'created': parse_date(record.get('created'))})
+        self.written['comment'] += insert_rows(Comment, comments)
+
+    def write_follows(self, records):
+        follows = []
+        for record in records:
+            user_id = self.resolve(self.users, record['user'], 'follow')
+            author_id = self.resolve(self.users, record['author'], 'follow')
+            if user_id is not None and author_id is not None:
+                follows.append({'user_id': user_id, 'author_id': author_id})
+        self.written['follow'] += insert_rows(Follow, follows,
+                                              ignore_conflicts=True)
+
+    def finish(self, timelines=True):
+        """Обслуживание, отложенное до конца загрузки."""
+        fixed = counters.reconcile()
+        blobs.reconcile()
+        rebuilt = 0
+        if timelines:
+            timeline.reset_modes()
+            followers = (Follow.objects.order_by('user_id')
+                         .values_list('user_id', flat=True).distinct())
+            for user_id in followers.iterator():
+                with transaction.atomic():
+                    timeline.rebuild(user_id)
+                rebuilt += 1
+        else:
+            timeline.mark_pulled()
+        if not search.fts_enabled():
+            search.rebuild()
+        pagecache.bump(pagecache.ALL)
+        objectcache.clear()
+        return fixed, rebuilt
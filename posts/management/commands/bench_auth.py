@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from posts import benchmark
+from posts.dataset import Dataset
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает число запросов и задержку index и follow_index для '
+            'авторизованного пользователя: сессия и пользователь из базы '
+            'или из кеша. Данные создаются во временной тестовой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Повторов каждого адреса.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with benchmark.environment():
+            scale = options['posts']
+            Dataset(users=max(50, scale // 50), posts=scale,
+                    comments=scale // 2, images=10,
+                    seed=options['seed']).load()
+            author, _ = benchmark.targets()
+            results = benchmark.compare_auth(author, options['requests'])
+        self.report(results)
+
+    def report(self, results):
+        self.stdout.write(f'{"view":<14}{"setup":<8}{"queries":>9}'
+                          f'{"p50":>9}{"p95":>9}   (ms)')
+        for name in benchmark.AUTH_VIEWS:
+            for setup, views in results.items():
+                stats = views[name]
+                self.stdout.write(
+                    f'{name:<14}{setup:<8}{stats["queries"]:>9}'
+                    f'{stats["p50"]:>9.2f}{stats["p95"]:>9.2f}')
+            saved = (results['db'][name]['queries']
+                     - results['cached'][name]['queries'])
+            self.stdout.write(f'{name}: запросов меньше на {saved}')
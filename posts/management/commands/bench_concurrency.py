@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts import benchmark
+from posts.dataset import Dataset
+from posts.models import Post, UserStats
+
+# Как было до настройки: журнал отката и fsync на каждую транзакцию.
+ROLLBACK_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full',
+                    'busy_timeout': 5000}
+
+
+class Command(BaseCommand):
+    help = ('Читатели лент и писатели постов и комментариев одновременно: '
+            'задержки чтения в журнале отката и в WAL с SQLITE_PRAGMAS. '
+            'Данные создаются во временной файловой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help='Секунд на каждый режим.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        # Процессам нужна общая файловая база, а не база в памяти.
+        with benchmark.environment(file_db=True):
+            results = self.bench(options)
+        self.report(results)
+
+    def bench(self, options):
+        scale = options['posts']
+        Dataset(users=max(50, scale // 50), posts=scale,
+                comments=scale // 2, seed=options['seed']).load()
+        writer = (UserStats.objects.select_related('user')
+                  .order_by('-posts_count').first().user)
+        reader = (UserStats.objects.exclude(user=writer)
+                  .select_related('user')
+                  .order_by('-following_count').first().user)
+        post = Post.objects.filter(author=writer).latest('pub_date')
+        results = {}
+        for mode, pragmas in (('rollback', ROLLBACK_PRAGMAS),
+                              ('wal', settings.SQLITE_PRAGMAS)):
+            # Журнал переключается новым соединением, пока оно одно.
+            connection.close()
+            with override_settings(SQLITE_PRAGMAS=pragmas):
+                connection.ensure_connection()
+                results[mode] = benchmark.concurrent(
+                    reader, writer, post, options['readers'],
+                    options['writers'], options['duration'])
+        return results
+
+    def report(self, results):
+        self.stdout.write(f'{"mode":<10}{"kind":<7}{"count":>7}{"p50":>9}'
+                          f'{"p95":>9}{"p99":>9}{"max":>9}{"errors":>8}'
+                          '   (ms)')
+        for mode, kinds in results.items():
+            for kind, stats in kinds.items():
+                self.stdout.write(
+                    f'{mode:<10}{kind:<7}{stats["count"]:>7}'
+                    + ''.join(f'{stats[name] or 0:>9.2f}'
+                              for name in ('p50', 'p95', 'p99', 'max'))
+                    + f'{stats["errors"]:>8}')
@@ -0,0 +1,117 @@
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts import counters, tiercache, timeline
+from posts.benchmark import percentile
+from posts.feed import FeedPaginator, HybridFeed
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+# Порог для чистого push (никто не читается при показе) и чистого pull
+# (читаются все авторы, у которых есть хотя бы один подписчик).
+PUSH_ONLY = 10 ** 9
+PULL_ONLY = 1
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержки чтения и записи ленты подписок для push, '
+            'pull и гибридной схемы на синтетическом графе подписок. '
+            'Все данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--celebrities', type=int, default=3,
+                            help='Авторы, на которых подписаны почти все.')
+        parser.add_argument('--follows', type=int, default=30,
+                            help='Обычных подписок на пользователя.')
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--samples', type=int, default=200)
+        parser.add_argument('--threshold', type=int, default=500,
+                            help='Порог подписчиков для гибридной схемы.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        with transaction.atomic(), tiercache.isolated():
+            user_ids, celebrity_ids = self.build_graph(options)
+            results = [
+                (name, self.run(threshold, user_ids, celebrity_ids,
+                                options['samples']))
+                for name, threshold in (
+                    ('push', PUSH_ONLY),
+                    ('pull', PULL_ONLY),
+                    ('hybrid', options['threshold']),
+                )
+            ]
+            transaction.set_rollback(True)
+        self.report(results)
+
+    def build_graph(self, options):
+        prefix = f'bench_{self.random.getrandbits(32):x}'
+        User.objects.bulk_create(
+            User(username=f'{prefix}_{i}') for i in range(options['users']))
+        user_ids = list(User.objects.filter(username__startswith=prefix)
+                        .values_list('pk', flat=True))
+        celebrity_ids = user_ids[:options['celebrities']]
+        follows = set()
+        for user_id in user_ids:
+            authors = self.random.sample(user_ids, options['follows'])
+            authors += [author for author in celebrity_ids
+                        if self.random.random() < 0.9]
+            follows.update((user_id, author) for author in authors
+                           if author != user_id)
+        Follow.objects.bulk_create(
+            (Follow(user_id=user, author_id=author)
+             for user, author in follows), batch_size=500)
+        Post.objects.bulk_create(
+            (Post(text='bench', author_id=self.author(user_ids,
+                                                      celebrity_ids))
+             for _ in range(options['posts'])), batch_size=500)
+        # bulk_create обходит сигналы: счётчики подписчиков — разом.
+        counters.reconcile()
+        return user_ids, celebrity_ids
+
+    def author(self, user_ids, celebrity_ids):
+        if self.random.random() < 0.1:
+            return self.random.choice(celebrity_ids)
+        return self.random.choice(user_ids)
+
+    def run(self, threshold, user_ids, celebrity_ids, samples):
+        with override_settings(FEED_PULL_THRESHOLD=threshold):
+            timeline.reset_modes()
+            for user_id in user_ids:
+                timeline.rebuild(user_id)
+            writes = []
+            for _ in range(samples):
+                author_id = self.author(user_ids, celebrity_ids)
+                started = time.perf_counter()
+                Post.objects.create(text='bench', author_id=author_id)
+                writes.append(time.perf_counter() - started)
+            reads = []
+            for _ in range(samples):
+                user_id = self.random.choice(user_ids)
+                started = time.perf_counter()
+                paginator = FeedPaginator(HybridFeed(user_id),
+                                          settings.POSTS_PER_PAGE)
+                page = paginator.get_page(None)
+                if page.has_next():
+                    paginator.get_page(page.next_cursor)
+                reads.append(time.perf_counter() - started)
+        return writes, reads
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"scheme":<8}{"write p50":>12}{"write p99":>12}'
+            f'{"read p50":>12}{"read p99":>12}   (ms)')
+        for name, (writes, reads) in results:
+            row = [percentile(samples, q) * 1000
+                   for samples in (writes, reads) for q in (0.5, 0.99)]
+            self.stdout.write(f'{name:<8}'
+                              + ''.join(f'{value:>12.2f}' for value in row))
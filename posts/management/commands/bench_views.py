@@ -0,0 +1,66 @@
+import json
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from posts import benchmark
+from posts.dataset import Dataset
+
+
+class Command(BaseCommand):
+    help = ('Замеряет все адреса posts/urls.py на синтетических данных '
+            'нескольких размеров: p50/p95/p99 задержки и число запросов. '
+            'Данные создаются во временной тестовой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+',
+                            default=[1000, 100000, 1000000],
+                            help='Число постов в наборах.')
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Повторов каждого адреса.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--baseline',
+                            help='JSON с прошлыми замерами для сравнения.')
+        parser.add_argument('--save', help='Куда записать замеры в JSON.')
+        parser.add_argument('--tolerance', type=float,
+                            default=benchmark.TOLERANCE,
+                            help='Допустимый рост p95 (доля).')
+
+    def handle(self, *args, **options):
+        with benchmark.environment():
+            results = {str(scale): self.bench(scale, options)
+                       for scale in sorted(options['scales'])}
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            regressions = benchmark.compare(results, baseline,
+                                            options['tolerance'])
+            for line in regressions:
+                self.stderr.write(f'РЕГРЕССИЯ {line}')
+            if regressions:
+                raise CommandError(f'Регрессий: {len(regressions)}')
+
+    def bench(self, scale, options):
+        call_command('flush', interactive=False, verbosity=0)
+        cache.clear()
+        Dataset(users=max(50, scale // 50), groups=max(5, scale // 10000),
+                posts=scale, comments=scale // 2, images=10,
+                seed=options['seed']).load()
+        results = benchmark.run(Client(), options['requests'])
+        self.report(scale, results)
+        return results
+
+    def report(self, scale, results):
+        self.stdout.write(f'\nПостов: {scale}')
+        self.stdout.write(f'{"view":<18}{"p50":>9}{"p95":>9}{"p99":>9}'
+                          f'{"queries":>9}{"status":>12}   (ms)')
+        for name, stats in results.items():
+            self.stdout.write(
+                f'{name:<18}{stats["p50"]:>9.2f}{stats["p95"]:>9.2f}'
+                f'{stats["p99"]:>9.2f}{stats["queries"]:>9}'
+                f'{stats["status"]!s:>12}')
@@ -0,0 +1,53 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import exporter
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает пользователей, группы, посты, комментарии '
+            'и подписки в JSON Lines (формат import_yatube) и по желанию '
+            'картинки постов в tar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help='Файл .jsonl или .jsonl.gz, «-» — '
+                                 'стандартный вывод.')
+        parser.add_argument('--media',
+                            help='Файл tar для картинок постов, «-» — '
+                                 'стандартный вывод (вместе с --output '
+                                 'в файл).')
+        parser.add_argument('--chunk-size', type=int,
+                            default=exporter.CHUNK_SIZE)
+
+    def open_output(self, path):
+        if path == '-':
+            return open(sys.stdout.fileno(), 'w', encoding='utf-8',
+                        closefd=False)
+        if path.endswith('.gz'):
+            return gzip.open(path, 'wt', encoding='utf-8')
+        return open(path, 'w', encoding='utf-8')
+
+    def handle(self, *args, **options):
+        if options['output'] == '-' and options['media'] == '-':
+            raise CommandError('JSON Lines и tar не могут вместе идти в '
+                               'стандартный вывод: укажите файл для '
+                               '--output или --media.')
+        chunk_size = options['chunk_size']
+        with self.open_output(options['output']) as stream:
+            total = exporter.write_jsonl(stream, chunk_size)
+        report = [f'Записей: {total}']
+        media = options['media']
+        if media:
+            if media == '-':
+                added, missing = exporter.write_media(sys.stdout.buffer,
+                                                      chunk_size)
+            else:
+                with open(media, 'wb') as archive:
+                    added, missing = exporter.write_media(archive,
+                                                          chunk_size)
+            report.append(f'файлов: {added}, нет в хранилище: {missing}')
+        # Итог в stderr: в stdout может идти сама выгрузка.
+        self.stderr.write(', '.join(report))
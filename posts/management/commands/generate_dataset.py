@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from posts.dataset import Dataset
+
+
+class Command(BaseCommand):
+    help = ('Генерирует воспроизводимый синтетический граф: пользователей, '
+            'группы, посты со степенным распределением авторов, '
+            'комментарии, подписки и картинки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int,
+                            help='По умолчанию столько же, сколько постов.')
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок на пользователя (до повторов).')
+        parser.add_argument('--images', type=int, default=10,
+                            help='Разных картинок в пуле.')
+        parser.add_argument('--image-share', type=float, default=0.2,
+                            help='Доля постов с картинкой.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='user',
+                            help='Префикс имён пользователей и групп.')
+
+    def handle(self, *args, **options):
+        dataset = Dataset(
+            users=options['users'], groups=options['groups'],
+            posts=options['posts'], comments=options['comments'],
+            follows=options['follows'], images=options['images'],
+            image_share=options['image_share'], seed=options['seed'],
+            prefix=options['prefix'])
+        written = dataset.load(
+            stdout=self.stdout if options['verbosity'] > 1 else None)
+        self.stdout.write(', '.join(f'{record_type}: {count}'
+                                    for record_type, count in written.items()))
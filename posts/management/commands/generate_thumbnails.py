@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import blobs, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Собирает варианты, размеры и цвет заглушки картинок постов, '
+            'у которых их ещё нет (например, загруженных раньше). '
+            'Оригиналы не пересжимаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересобрать варианты у всех постов.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            posts = posts.filter(Q(thumbnail_url='') | Q(image_variants='')
+                                 | Q(image_width__isnull=True))
+        done = failed = 0
+        # Общий файл при --all режется заново один раз.
+        rebuilt = set()
+        for post in posts.iterator():
+            rebuild = options['all'] and post.image.name not in rebuilt
+            rebuilt.add(post.image.name)
+            try:
+                blobs.prepare(post, rebuild=rebuild)
+            except OSError as error:
+                failed += 1
+                self.stderr.write(f'Пост {post.pk}: {error}')
+                continue
+            post.save(update_fields=thumbnails.FIELDS)
+            done += 1
+        self.stdout.write(f'Обработано постов: {done}, ошибок: {failed}')
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = ('Потоково загружает пользователей, группы, посты, комментарии '
+            'и подписки из JSON Lines или CSV. Картинки постов — имена уже '
+            'лежащих в хранилище файлов; варианты для них собирает '
+            'generate_thumbnails.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+',
+                            help='Файлы .jsonl или .csv (можно .gz), '
+                                 '«-» — стандартный ввод.')
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            help='Формат входа (по умолчанию по расширению).')
+        parser.add_argument('--type', choices=importer.TYPES,
+                            help='Тип записей CSV без столбца type.')
+        parser.add_argument('--batch-size', type=int,
+                            default=importer.BATCH_SIZE)
+        parser.add_argument('--no-timelines', action='store_true',
+                            help='Не пересобирать ленты подписок в конце.')
+
+    def records(self, path, options):
+        name = path[:-len('.gz')] if path.endswith('.gz') else path
+        record_format = options['format'] or (
+            'csv' if name.endswith('.csv') else 'jsonl')
+        with importer.open_input(path) as stream:
+            if record_format == 'csv':
+                yield from importer.read_csv(stream, options['type'])
+            else:
+                yield from importer.read_jsonl(stream)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        loader = importer.Importer(
+            options['batch_size'],
+            stdout=self.stdout if options['verbosity'] > 1 else None)
+        try:
+            for path in options['paths']:
+                loader.run(self.records(path, options))
+        except (importer.InvalidRecord, KeyError) as error:
+            raise CommandError(f'Неверная запись: {error}')
+        loaded = time.perf_counter() - started
+        fixed, rebuilt = loader.finish(timelines=not options['no_timelines'])
+        for record_type in importer.TYPES:
+            self.stdout.write(f'{record_type}: записано '
+                              f'{loader.written[record_type]}, пропущено '
+                              f'{loader.skipped[record_type]}')
+        self.stdout.write(
+            f'Загрузка {loaded:.1f} с, счётчиков исправлено '
+            f'{sum(fixed.values())}, лент пересобрано {rebuilt}, всего '
+            f'{time.perf_counter() - started:.1f} с')
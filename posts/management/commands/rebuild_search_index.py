@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает поисковый индекс постов: FTS5, если он есть, '
+            'иначе запасной индекс SearchTerm.')
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        backend = 'FTS5' if search.fts_enabled() else 'SearchTerm'
+        self.stdout.write(f'Индекс {backend} пересобран')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счётчики с таблицами '
+            'и чинит расхождения.')
+
+    def handle(self, *args, **options):
+        for name, fixed in counters.reconcile().items():
+            self.stdout.write(f'{name}: исправлено строк {fixed}')
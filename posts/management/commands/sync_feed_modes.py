@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = ('Сверяет режимы лент авторов с FEED_PULL_THRESHOLD: переводит '
+            'в pull-режим набравших порог, а опустившимся ниже дописывает '
+            'посты в ленты подписчиков. Запускается по расписанию.')
+
+    def handle(self, *args, **options):
+        pulled, pushed = timeline.sync_modes()
+        self.stdout.write(f'В pull-режим: {pulled}, в push-режим: {pushed}')
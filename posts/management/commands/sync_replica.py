@@ -0,0 +1,35 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в реплики из DATABASE_REPLICAS '
+            '(или в --database) онлайн-резервированием: локальная реплика '
+            'для разработки и проверки маршрутизации.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append',
+                            help='Псевдоним реплики; можно несколько.')
+
+    def handle(self, *args, **options):
+        aliases = options['database'] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError('Реплик нет: задайте DATABASE_REPLICAS '
+                               'или --database')
+        source = connections['default']
+        for alias in aliases:
+            target = connections[alias]
+            if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+                raise CommandError(f'{alias}: копируется только SQLite')
+            source.ensure_connection()
+            # Соединения реплики в этом процессе не должны держать файл.
+            target.close()
+            copy = sqlite3.connect(target.settings_dict['NAME'])
+            try:
+                source.connection.backup(copy)
+            finally:
+                copy.close()
+            self.stdout.write(f'{alias}: скопировано')
@@ -0,0 +1,229 @@
+"""Метрики запросов по именам URL: число SQL-запросов, время SQL,
+время рендера шаблонов и общая задержка.
+
+Значения копятся в гистограммах внутри процесса и отдаются страницей
+``/metrics/`` в текстовом формате Prometheus. Если запрос выходит за
+бюджет из ``METRICS_BUDGETS``, в лог ``yatube.metrics`` пишется
+предупреждение.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import Template
+
+from . import objectcache, pagecache
+
+logger = logging.getLogger('yatube.metrics')
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5)
+HISTOGRAMS = {
+    'queries': ('yatube_view_queries',
+                'SQL-запросов за запрос', QUERY_BUCKETS),
+    'sql': ('yatube_view_sql_seconds',
+            'Время в SQL за запрос', SECONDS_BUCKETS),
+    'template': ('yatube_view_template_seconds',
+                 'Время рендера шаблонов за запрос', SECONDS_BUCKETS),
+    'latency': ('yatube_view_latency_seconds',
+                'Полное время обработки запроса', SECONDS_BUCKETS),
+}
+UNRESOLVED = '<unresolved>'
+
+_current = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """Гистограммы и счётчики нарушений бюджета по именам URL."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.histograms = {
+            metric: defaultdict(lambda buckets=buckets: Histogram(buckets))
+            for metric, (_, _, buckets) in HISTOGRAMS.items()
+        }
+        self.violations = defaultdict(int)
+
+    def observe(self, view, sample):
+        with self.lock:
+            for metric, value in sample.items():
+                self.histograms[metric][view].observe(value)
+
+    def violation(self, view, kind):
+        with self.lock:
+            self.violations[view, kind] += 1
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric, (name, help_text, _) in HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}',
+                          f'# TYPE {name} histogram']
+                for view, histogram in sorted(self.histograms[metric].items()):
+                    for bound, total in histogram.cumulative():
+                        lines.append(
+                            f'{name}_bucket{{view="{view}",le="{bound}"}} '
+                            f'{total}')
+                    lines.append(f'{name}_sum{{view="{view}"}} '
+                                 f'{histogram.sum:g}')
+                    lines.append(f'{name}_count{{view="{view}"}} '
+                                 f'{histogram.count}')
+            lines += ['# HELP yatube_view_budget_violations_total '
+                      'Запросы сверх бюджета',
+                      '# TYPE yatube_view_budget_violations_total counter']
+            for (view, kind), total in sorted(self.violations.items()):
+                lines.append('yatube_view_budget_violations_total'
+                             f'{{view="{view}",kind="{kind}"}} {total}')
+        lines += cache_lines()
+        return '\n'.join(lines) + '\n'
+
+
+def cache_lines():
+    """Счётчики кеша страниц, кеша объектов и двухуровневого кеша."""
+    lines = ['# HELP yatube_page_cache_events_total События кеша страниц',
+             '# TYPE yatube_page_cache_events_total counter']
+    for event, total in pagecache.stats().items():
+        lines.append(
+            f'yatube_page_cache_events_total{{event="{event}"}} {total}')
+    lines += ['# HELP yatube_object_cache_events_total События кеша '
+              'объектов',
+              '# TYPE yatube_object_cache_events_total counter']
+    object_stats = objectcache.stats()
+    for model, events in object_stats.items():
+        for event in objectcache.STAT_EVENTS:
+            lines.append('yatube_object_cache_events_total'
+                         f'{{model="{model}",event="{event}"}} '
+                         f'{events[event]}')
+    lines += ['# HELP yatube_object_cache_hit_ratio Доля попаданий кеша '
+              'объектов',
+              '# TYPE yatube_object_cache_hit_ratio gauge']
+    for model, events in object_stats.items():
+        lines.append(f'yatube_object_cache_hit_ratio{{model="{model}"}} '
+                     f'{events["hit_ratio"]:g}')
+    # Счётчики двухуровневого кеша — по префиксам ключей, в процессе.
+    if hasattr(cache, 'stats'):
+        lines += ['# HELP yatube_cache_events_total События кеша '
+                  'по префиксам ключей',
+                  '# TYPE yatube_cache_events_total counter']
+        for prefix, events in cache.stats().items():
+            for event, total in events.items():
+                lines.append(
+                    'yatube_cache_events_total'
+                    f'{{prefix="{prefix}",event="{event}"}} {total}')
+    return lines
+
+
+registry = Registry()
+
+
+def _instrument_templates():
+    """Оборачивает рендер шаблонов верхнего уровня один раз на процесс.
+
+    Вложенные ``{% include %}`` идут мимо ``backends.django.Template``,
+    поэтому время не считается дважды.
+    """
+    if getattr(Template.render, 'instrumented', False):
+        return
+    render = Template.render
+
+    @wraps(render)
+    def timed_render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            sample = getattr(_current, 'sample', None)
+            if sample is not None:
+                sample['template'] += time.perf_counter() - started
+
+    timed_render.instrumented = True
+    Template.render = timed_render
+
+
+def budget_for(view):
+    budgets = settings.METRICS_BUDGETS
+    return {**budgets.get('default', {}), **budgets.get(view, {})}
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _instrument_templates()
+
+    def __call__(self, request):
+        sample = {'queries': 0, 'sql': 0.0, 'template': 0.0}
+        _current.sample = sample
+
+        def record_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                sample['queries'] += 1
+                sample['sql'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            _current.sample = None
+        sample['latency'] = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else UNRESOLVED
+        if view != 'metrics':
+            registry.observe(view, sample)
+            self.check_budget(request, view, sample)
+        return response
+
+    def check_budget(self, request, view, sample):
+        for kind, limit in budget_for(view).items():
+            if sample[kind] > limit:
+                registry.violation(view, kind)
+                logger.warning('%s %s: %s=%s превышает бюджет %s',
+                               view, request.path, kind, sample[kind], limit)
+
+
+def metrics(request):
+    """Метрики в формате Prometheus: для INTERNAL_IPS и персонала."""
+    allowed = (request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+               or request.user.is_staff)
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4')
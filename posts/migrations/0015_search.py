@@ -0,0 +1,79 @@
+# Generated by Django 2.2.28 on 2026-10-18 18:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Индекс FTS5 с внешним содержимым: текст хранится только в posts_post,
+# триггеры держат индекс в согласии с таблицей при любой записи.
+FTS_SQL = [
+    """CREATE VIRTUAL TABLE posts_search USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER posts_search_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_search(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER posts_search_delete AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_search(posts_search, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER posts_search_update AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO posts_search(posts_search, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_search(rowid, text) VALUES (new.id, new.text);
+    END""",
+    "INSERT INTO posts_search(posts_search) VALUES ('rebuild')",
+]
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS posts_search_insert',
+    'DROP TRIGGER IF EXISTS posts_search_delete',
+    'DROP TRIGGER IF EXISTS posts_search_update',
+    'DROP TABLE IF EXISTS posts_search',
+]
+
+
+def fts5_available(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        options = {row[0] for row in cursor.fetchall()}
+    return 'ENABLE_FTS5' in options
+
+
+def create_fts(apps, schema_editor):
+    # Без FTS5 поиск работает по запасному индексу SearchTerm.
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or not fts5_available(connection):
+        return
+    for sql in FTS_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_image_description'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'post'], name='search_term_post_idx'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
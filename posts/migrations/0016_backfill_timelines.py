@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def fill_timelines(apps, schema_editor):
+    # Ленты подписчиков, которые появились до TimelineEntry: без этого
+    # /follow/ пуст до ручного rebuild_timelines. Уже собранные ленты
+    # не трогаем.
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    UserStats = apps.get_model('posts', 'UserStats')
+    pulled = set(UserStats.objects
+                 .filter(followers_count__gte=settings.FEED_PULL_THRESHOLD)
+                 .values_list('user_id', flat=True))
+    filled = set(TimelineEntry.objects.values_list('user_id', flat=True)
+                 .distinct())
+    readers = (Follow.objects.exclude(author_id__in=pulled)
+               .values_list('user_id', flat=True).distinct().order_by())
+    for user_id in readers:
+        if user_id in filled:
+            continue
+        posts = (Post.objects.filter(author__following__user_id=user_id)
+                 .exclude(author_id__in=pulled)
+                 .order_by('-pub_date', '-pk')
+                 .values_list('pk', 'author_id', 'pub_date')
+                 .distinct()[:settings.TIMELINE_MAX_LENGTH])
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, post_id=pk, author_id=author_id,
+                           pub_date=pub_date)
+             for pk, author_id, pub_date in posts],
+            batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.functional import cached_property
+
+from . import thumbnails
+from .storage import image_storage
 
 User = get_user_model()
 
@@ -24,6 +28,12 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты вместе с автором и группой одним запросом."""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(
         "Текст",
@@ -48,14 +58,91 @@ class Post(models.Model):
         verbose_name="Группа",
         help_text='Выберите группу'
     )
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    image = models.ImageField(upload_to='posts/', storage=image_storage,
+                              blank=True, null=True)
+    comment_count = models.IntegerField(
+        "Комментариев",
+        default=0,
+        editable=False,
+    )
+    # Миниатюра для карточки поста, см. posts/thumbnails.py.
+    thumbnail_url = models.CharField(max_length=255, blank=True,
+                                     editable=False)
+    thumbnail_width = models.PositiveIntegerField(null=True, editable=False)
+    thumbnail_height = models.PositiveIntegerField(null=True, editable=False)
+    # Манифест вариантов картинки (JSON): тип, ширина, высота и адрес.
+    image_variants = models.TextField(blank=True, editable=False)
+    # Размеры оригинала и цвет заглушки: шаблону не нужно открывать файл.
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        # Ленты: вся, автора и группы — по убыванию даты. Индексы по
+        # возрастанию: SQLite дописывает в конец индекса rowid и, читая
+        # индекс с конца, отдаёт ключ курсора (pub_date, id) по убыванию
+        # без сортировки.
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @cached_property
+    def image_sources(self):
+        return thumbnails.sources(self.image_variants)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Группа на момент загрузки: при переносе поста в другую группу
+        # кеш страниц сбрасывается и у старой группы.
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        # Файл на момент загрузки: при смене картинки ссылка на старый
+        # файл освобождается.
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
+
+class ImageBlob(models.Model):
+    """Файл картинки в хранилище по хешу и число постов, которые его
+    используют. Логика — в posts/blobs.py.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    # SHA-256 исходной загрузки: оригинал хранится уже пересжатым.
+    upload_digest = models.CharField(max_length=64, blank=True,
+                                     db_index=True)
+    image_variants = models.TextField(blank=True)
+    image_width = models.PositiveIntegerField(null=True)
+    image_height = models.PositiveIntegerField(null=True)
+    image_color = models.CharField(max_length=7, blank=True)
+    references = models.PositiveIntegerField(default=0)
+
+
+class SearchTerm(models.Model):
+    """Запасной поисковый индекс, когда в SQLite нет FTS5: слово, пост и
+    число вхождений. Логика — в posts/search.py.
+    """
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='+')
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'post'],
+                         name='search_term_post_idx'),
+        ]
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -78,6 +165,12 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User,
@@ -90,3 +183,56 @@ class Follow(models.Model):
                                blank=False,
                                null=False,
                                related_name='following')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    ``author`` и ``pub_date`` продублированы из поста, чтобы чтение ленты
+    и отписка были диапазонными запросами по индексам этой таблицы.
+    """
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя для карточки автора.
+
+    Поддерживаются атомарными ``F()``-инкрементами из сигналов, сверяются
+    командой ``reconcile_counters``.
+    """
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='stats')
+    posts_count = models.IntegerField("Записей", default=0)
+    followers_count = models.IntegerField("Подписчиков", default=0,
+                                          db_index=True)
+    following_count = models.IntegerField("Подписан", default=0)
+    # Посты автора читаются при показе ленты, а не раскладываются по лентам
+    # подписчиков, см. posts/feed.py.
+    feed_pulled = models.BooleanField(default=False, db_index=True)
@@ -0,0 +1,184 @@
+"""Кеш объектов, которые view находят по адресу: пользователь по имени,
+группа по slug, пост по id. Тот же кеш по id отдаёт пользователя
+сессии (``backends.CachedModelBackend``).
+
+Чтение сквозное: промах идёт в базу и кладёт результат в кеш. Сигналы
+записи удаляют запись объекта, так что следующий запрос прочитает его
+заново. Переименованный объект находится и по старому значению: рядом
+с записью лежит ключ по id с последним значением поля, и сигнал удаляет
+записи под обоими.
+
+Отсутствие объекта тоже кешируется, но коротко
+(``OBJECT_CACHE_NEGATIVE_TIMEOUT``): перебор несуществующих адресов не
+доходит до базы, а созданный объект сбрасывает свою отрицательную
+запись сигналом.
+
+Чтение из базы может разминуться со сбросом: запрос прочитал старую
+версию, сигнал удалил запись, запрос положил старую версию обратно. Поэтому
+у записи есть метка — счётчик рядом с ней, который сброс увеличивает
+сразу и ещё раз после фиксации транзакции. Запись хранит метку,
+прочитанную до обращения к базе, и со сдвинутой меткой не годится.
+
+Записи, которые меняются в обход сигналов (``bulk_create``, ``update``
+в загрузке и сверке счётчиков), сбрасываются все сразу через
+``clear()`` — общий счётчик поколения, как в ``pagecache``.
+
+Связанные объекты в кеш не попадают: счётчики ``UserStats`` меняются
+с каждым постом, а автор и группа поста — своими сигналами. При промахе
+они читаются тем же запросом (``select_related``), а при попадании —
+отдельно, когда понадобятся.
+
+Попадания и промахи считаются по моделям в памяти процесса
+(``stats()``) и выводятся на ``/metrics/``.
+"""
+import copy
+import threading
+from collections import defaultdict
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+
+from . import pagecache, routers
+from .models import Group, Post
+
+User = get_user_model()
+
+GENERATION_KEY = 'objects:generation'
+STAT_EVENTS = ('hits', 'negative_hits', 'misses')
+
+_lock = threading.Lock()
+_stats = defaultdict(lambda: dict.fromkeys(STAT_EVENTS, 0))
+
+
+def _without_related(instance):
+    stored = copy.copy(instance)
+    stored._state = copy.copy(instance._state)
+    stored._state.fields_cache = {}
+    return stored
+
+
+def _record(name, event):
+    with _lock:
+        _stats[name][event] += 1
+
+
+class ObjectCache:
+    """Объекты ``model`` по значению поля ``field``.
+
+    ``select_related`` — связи, которые при промахе читаются вместе с
+    объектом, но в кеш не кладутся.
+    """
+
+    def __init__(self, name, model, field, select_related=()):
+        self.name = name
+        self.model = model
+        self.field = field
+        self.select_related = select_related
+
+    def key(self, value):
+        return f'objects:{self.name}:{quote(str(value))}'
+
+    def _index_key(self, pk):
+        # Последнее закешированное значение поля объекта ``pk``.
+        return f'objects:{self.name}:#{pk}'
+
+    def _stamp_key(self, key):
+        return f'{key}:stamp'
+
+    def get(self, value):
+        """Объект с ``field == value`` или ``None``."""
+        key = self.key(value)
+        stamp_key = self._stamp_key(key)
+        values = cache.get_many([GENERATION_KEY, key, stamp_key])
+        generation = values.get(GENERATION_KEY)
+        if generation is None:
+            generation = pagecache.counter(GENERATION_KEY)
+        stamp = values.get(stamp_key)
+        entry = values.get(key)
+        if (entry is not None and stamp is not None
+                and entry[:2] == (generation, stamp)):
+            instance = entry[2]
+            _record(self.name,
+                    'hits' if instance is not None else 'negative_hits')
+            return instance
+        _record(self.name, 'misses')
+        if stamp is None:
+            stamp = pagecache.counter(stamp_key)
+        queryset = self.model._default_manager.select_related(
+            *self.select_related)
+        try:
+            # Запись живёт до сброса сигналом: отстающая реплика
+            # закрепила бы в кеше старую версию.
+            with routers.primary():
+                instance = queryset.get(**{self.field: value})
+        except (self.model.DoesNotExist, ValueError):
+            cache.set(key, (generation, stamp, None),
+                      settings.OBJECT_CACHE_NEGATIVE_TIMEOUT)
+            return None
+        entries = {key: (generation, stamp, _without_related(instance))}
+        if self.field != 'pk':
+            entries[self._index_key(instance.pk)] = value
+        cache.set_many(entries, settings.OBJECT_CACHE_TIMEOUT)
+        return instance
+
+    def get_or_404(self, value):
+        instance = self.get(value)
+        if instance is None:
+            raise Http404(f'No {self.model._meta.object_name} matches '
+                          'the given query.')
+        return instance
+
+    def invalidate(self, instance):
+        """Забывает ``instance`` под текущим и прежним значением поля."""
+        keys = [self.key(getattr(instance, self.field))]
+        index = []
+        if self.field != 'pk':
+            index.append(self._index_key(instance.pk))
+            old_value = cache.get(index[0])
+            if old_value is not None:
+                keys.append(self.key(old_value))
+        stamps = [self._stamp_key(key) for key in keys]
+        pagecache.increment(*stamps)
+        cache.delete_many(keys + index)
+        # До фиксации другие запросы ещё читают из базы старую версию.
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: pagecache.increment(*stamps))
+
+
+users = ObjectCache('user', User, 'username', select_related=('stats',))
+groups = ObjectCache('group', Group, 'slug')
+posts = ObjectCache('post', Post, 'pk', select_related=('group',))
+# Пользователь сессии для ``backends.CachedModelBackend``.
+session_users = ObjectCache('session_user', User, 'pk')
+CACHES = (users, groups, posts, session_users)
+
+
+def clear():
+    """Сбрасывает все объекты разом, например после записи в обход
+    сигналов."""
+    pagecache.increment(GENERATION_KEY)
+
+
+def stats():
+    """Счётчики и доля попаданий по моделям в этом процессе.
+
+    Попадание — и найденный объект, и закешированное отсутствие.
+    """
+    with _lock:
+        result = {}
+        for object_cache in CACHES:
+            events = dict(_stats[object_cache.name])
+            total = sum(events.values())
+            hits = events['hits'] + events['negative_hits']
+            events['hit_ratio'] = hits / total if total else 0.0
+            result[object_cache.name] = events
+        return result
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
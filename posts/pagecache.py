@@ -0,0 +1,281 @@
+"""Кеш целых страниц лент для анонимных читателей.
+
+Запись страницы помнит счётчики поколений, при которых она собрана:
+общий (``all``) и счётчик своей области — ``index``, ``group:<slug>``
+или ``profile:<username>``. Сигналы на запись увеличивают счётчики
+затронутых областей, и все страницы этих областей разом устаревают:
+без перебора ключей, один ``incr`` на область.
+
+Устаревшую или истекающую страницу пересобирает только один воркер —
+тот, кто взял блокировку ``cache.add``. Остальные в это время отдают
+устаревшую копию или, если её нет, ждут свежую. Срок жизни страницы
+заканчивается вероятностно раньше (XFetch): чем дороже сборка, тем
+раньше кто-то один начнёт её заново, пока остальные ещё видят свежую.
+
+Страницы авторизованных пользователей персональны (имя в шапке, кнопки
+редактирования и подписки), поэтому они не кешируются.
+
+Те же счётчики служат валидаторами условных запросов (``conditional_page``):
+ETag — хеш поколений области и id пользователя, Last-Modified — время
+последнего сброса области. Пока области не менялись, ответ — 304 без
+запросов к базе и без сборки страницы.
+
+События кеша (сборки, раннее обновление, отданные устаревшие копии,
+ожидания) считаются в памяти процесса (``stats()``) и выводятся на
+``/metrics/``.
+"""
+import hashlib
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+from . import routers
+from .models import Group
+
+ALL = 'all'
+INDEX = 'index'
+PAGE_CACHE_POLL_INTERVAL = 0.05
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def _generation_key(scope):
+    return f'pages:generation:{scope}'
+
+
+def _modified_key(scope):
+    return f'pages:modified:{scope}'
+
+
+def _initial_generation():
+    # Если счётчик вытеснили, новое значение не должно совпасть со старыми.
+    return time.time_ns()
+
+
+def counter(key):
+    """Значение счётчика поколения ``key``; отсутствующий заводится заново.
+
+    Счётчики общие с ``objectcache``.
+    """
+    cache.add(key, _initial_generation(), None)
+    return cache.get(key)
+
+
+def increment(*keys):
+    """Увеличивает счётчики поколений ``keys``."""
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), None)
+
+
+def generations(*scopes):
+    """Текущие значения счётчиков для ``scopes`` одним запросом к кешу."""
+    keys = [_generation_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            values[key] = counter(key)
+    return [values[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сбрасывает все закешированные страницы областей ``scopes``."""
+    now = time.time()
+    increment(*{_generation_key(scope) for scope in scopes})
+    cache.set_many({_modified_key(scope): now for scope in scopes}, None)
+
+
+def modified(*scopes):
+    """Время последнего сброса самой свежей из ``scopes``.
+
+    Если отметку вытеснили из кеша, считается, что область изменилась
+    только что.
+    """
+    keys = [_modified_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time(), None)
+            values[key] = cache.get(key)
+    return max(values.values())
+
+
+STAT_EVENTS = ('regenerated', 'early', 'stale_served', 'waited')
+
+
+_lock = threading.Lock()
+_stats = dict.fromkeys(STAT_EVENTS, 0)
+
+
+def record(event):
+    # В памяти процесса: запись в общий кеш на каждое событие легла бы
+    # на горячий путь чтения как раз во время наплыва.
+    with _lock:
+        _stats[event] += 1
+
+
+def stats():
+    """Счётчики событий кеша страниц в этом процессе.
+
+    ``saved`` — сколько сборок страницы не понадобилось благодаря
+    блокировке: запрос получил устаревшую копию или дождался чужой сборки.
+    """
+    with _lock:
+        result = dict(_stats)
+    result['saved'] = result['stale_served'] + result['waited']
+    return result
+
+
+def reset_stats():
+    with _lock:
+        _stats.update(dict.fromkeys(STAT_EVENTS, 0))
+
+
+class CachedPage:
+    """Страница в кеше: одна запись на адрес и блокировка на её сборку."""
+
+    def __init__(self, request, scope):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        self.key = f'pages:{scope}:{path}'
+        self.lock_key = f'pages:lock:{scope}:{path}'
+        self.versions = generations(ALL, scope)
+
+    def get(self, render):
+        entry = cache.get(self.key)
+        current = entry is not None and entry['versions'] == self.versions
+        if current and not self._expires_early(entry):
+            return entry['response']
+        if cache.add(self.lock_key, 1, settings.PAGE_CACHE_LOCK_TIMEOUT):
+            try:
+                if current:
+                    record('early')
+                return self._regenerate(render)
+            finally:
+                cache.delete(self.lock_key)
+        if entry is not None:
+            record('stale_served')
+            return entry['response']
+        entry = self._wait()
+        if entry is not None:
+            record('waited')
+            return entry['response']
+        # Сборщик не успел: собираем сами, но кеш не трогаем.
+        return render()
+
+    def _expires_early(self, entry):
+        gap = -entry['delta'] * settings.PAGE_CACHE_EARLY_BETA * math.log(
+            1.0 - random.random())
+        return time.time() + gap >= entry['expires']
+
+    def _regenerate(self, render):
+        started = time.time()
+        response = render()
+        record('regenerated')
+        if response.status_code == 200 and not response.cookies:
+            finished = time.time()
+            entry = {
+                'response': response,
+                'versions': self.versions,
+                'expires': finished + settings.PAGE_CACHE_TIMEOUT,
+                'delta': finished - started,
+            }
+            cache.set(self.key, entry, settings.PAGE_CACHE_TIMEOUT
+                      + settings.PAGE_CACHE_STALE_TIMEOUT)
+        return response
+
+    def _wait(self):
+        deadline = time.time() + settings.PAGE_CACHE_LOCK_WAIT
+        while time.time() < deadline:
+            time.sleep(PAGE_CACHE_POLL_INTERVAL)
+            entry = cache.get(self.key)
+            if entry is not None and entry['versions'] == self.versions:
+                return entry
+        return None
+
+
+def cache_feed_page(scope):
+    """Кеширует ответ view для анонимных GET-запросов.
+
+    ``scope`` получает именованные аргументы view и возвращает область
+    страницы.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            page = CachedPage(request, scope(**kwargs))
+            return page.get(lambda: view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def validators(request, *scopes):
+    """``(etag, last_modified)`` страницы областей ``scopes``.
+
+    Считаются один раз на запрос. Last-Modified только для анонимных:
+    после входа страница та же по времени, но другая по содержимому, и
+    отличить её может только ETag. ETag вошедшего пользователя зависит и
+    от cookie CSRF: вход меняет секрет, и страница с формой из кеша
+    браузера отправила бы старый токен.
+    """
+    cached = getattr(request, '_page_validators', None)
+    if cached is None:
+        user_id = request.user.pk if request.user.is_authenticated else 0
+        versions = generations(ALL, *scopes)
+        personal = ''
+        if user_id:
+            personal = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+        etag = hashlib.md5(
+            f'{scopes}:{versions}:{user_id}:{personal}'.encode()).hexdigest()
+        last_modified = None
+        changed = modified(ALL, *scopes)
+        # Last-Modified с точностью до секунды: изменение в ту же секунду
+        # его бы не сдвинуло, поэтому свежая отметка не отдаётся.
+        if not user_id and time.time() - changed >= 1:
+            last_modified = datetime.fromtimestamp(changed, timezone.utc)
+        # Реплика могла ещё не получить изменение, а ETag уже новый.
+        if time.time() - changed < settings.REPLICA_STICKY_SECONDS:
+            routers.read_from_primary()
+        cached = request._page_validators = (etag, last_modified)
+    return cached
+
+
+def conditional_page(scope):
+    """Отвечает 304 на условный GET, если области страницы не менялись.
+
+    ``scope`` — как у ``cache_feed_page``.
+    """
+    def etag(request, *args, **kwargs):
+        return validators(request, scope(**kwargs))[0]
+
+    def last_modified(request, *args, **kwargs):
+        return validators(request, scope(**kwargs))[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def post_scopes(post, *group_ids):
+    """Области страниц, на которых виден ``post``."""
+    scopes = [INDEX, profile_scope(post.author.username)]
+    group_ids = {post.group_id, *group_ids} - {None}
+    if group_ids:
+        slugs = Group.objects.filter(pk__in=group_ids).values_list(
+            'slug', flat=True)
+        scopes.extend(group_scope(slug) for slug in slugs)
+    return scopes
@@ -0,0 +1,218 @@
+"""Постраничная навигация по лентам постов.
+
+Поддерживаются два режима:
+
+* нумерованные страницы (``?page=N``) для небольших выборок — COUNT
+  ограничен сверху ``PAGINATOR_COUNT_LIMIT``, поэтому не растёт вместе
+  с таблицей;
+* курсор по ключу ``(pub_date, id)`` (``?cursor=...``) — каждая страница
+  это один индексный диапазонный запрос без OFFSET и без COUNT, поэтому
+  глубокие страницы стоят столько же, сколько первая.
+"""
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+
+FORWARD = 'n'
+BACKWARD = 'p'
+# Поля ключа: дата и уникальный id, разбивающий равные даты.
+POST_KEYS = ('pub_date', 'pk')
+
+
+def encode_cursor(obj, direction=FORWARD, keys=POST_KEYS):
+    """Непрозрачный токен курсора для позиции ``obj``."""
+    date_field, pk_field = keys
+    pub_date, pk = getattr(obj, date_field), getattr(obj, pk_field)
+    raw = f'{direction}{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора в ``(direction, pub_date, pk)``.
+
+    Для повреждённого токена возвращает ``None``.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, raw = raw[0], raw[1:]
+        date_part, pk_part = raw.rsplit('|', 1)
+        pub_date = parse_datetime(date_part)
+        pk = int(pk_part)
+    except (ValueError, IndexError, UnicodeError, binascii.Error):
+        return None
+    if direction not in (FORWARD, BACKWARD) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class BoundedCount:
+    """Обёртка над QuerySet, которая считает строки не дальше ``limit``.
+
+    ``Paginator`` вызывает ``count()`` у списка объектов, поэтому COUNT
+    превращается в ``SELECT COUNT(*) FROM (... LIMIT limit + 1)``.
+    """
+
+    def __init__(self, queryset, limit):
+        self.queryset = queryset
+        self.limit = limit
+        self.truncated = False
+        self.ordered = queryset.ordered
+
+    def count(self):
+        total = self.queryset[:self.limit + 1].count()
+        self.truncated = total > self.limit
+        return min(total, self.limit)
+
+    def __getitem__(self, key):
+        return self.queryset[key]
+
+
+class ApproximateCountPaginator(Paginator):
+    """Пагинатор списков админки для больших таблиц.
+
+    Точный COUNT — не дальше ``ADMIN_COUNT_LIMIT`` строк. Если строк
+    больше, для таблицы без фильтров число оценивается по ``MAX(id)``
+    (один шаг по первичному ключу), а отфильтрованный список
+    показывается до лимита.
+    """
+
+    @cached_property
+    def count(self):
+        # Для подсчёта порядок не нужен.
+        bounded = BoundedCount(self.object_list.order_by(),
+                               settings.ADMIN_COUNT_LIMIT)
+        total = bounded.count()
+        if bounded.truncated and not self.object_list.query.where:
+            estimate = (self.object_list.order_by()
+                        .aggregate(last=Max('pk'))['last'])
+            total = max(total, estimate or 0)
+        return total
+
+
+class CursorPage(Page):
+    """Страница курсорной навигации: без номера и без общего числа."""
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Page cursor>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def key_ordering(keys):
+    return tuple(f'-{field}' for field in keys)
+
+
+def seek(queryset, keys, position=None, descending=True):
+    """Упорядочивает ``queryset`` по ключу и отрезает всё до ``position``.
+
+    ``position`` — пара ``(pub_date, pk)``; строки берутся строго после
+    неё в направлении обхода.
+    """
+    if position is not None:
+        date_field, pk_field = keys
+        pub_date, pk = position
+        op = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__{op}': pub_date})
+            | Q(**{date_field: pub_date, f'{pk_field}__{op}': pk})
+        )
+    return queryset.order_by(*(key_ordering(keys) if descending else keys))
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу ``(pub_date, id)`` в порядке убывания.
+
+    ``keys`` — имена полей ключа у объектов ``object_list``; индекс
+    должен покрывать их в том же порядке.
+    """
+
+    def __init__(self, object_list, per_page, keys=POST_KEYS, **kwargs):
+        self.keys = keys
+        super().__init__(object_list, per_page, **kwargs)
+
+    def _rows(self, position=None, descending=True):
+        """Не больше ``per_page + 1`` строк после ``position``."""
+        queryset = seek(self.object_list, self.keys, position, descending)
+        return list(queryset[:self.per_page + 1])
+
+    def get_page(self, cursor):
+        """Как ``Paginator.get_page``: плохой курсор даёт первую страницу."""
+        return self.page(cursor)
+
+    def page(self, cursor):
+        position = decode_cursor(cursor) if cursor else None
+        if position is None:
+            return self._forward(self._rows(), has_previous=False)
+        direction, pub_date, pk = position
+        if direction == BACKWARD:
+            return self._backward((pub_date, pk))
+        return self._forward(self._rows((pub_date, pk)), has_previous=True)
+
+    def _forward(self, rows, has_previous):
+        items = rows[:self.per_page]
+        next_cursor = previous_cursor = None
+        if len(rows) > self.per_page:
+            next_cursor = encode_cursor(items[-1], FORWARD, self.keys)
+        if has_previous and items:
+            previous_cursor = encode_cursor(items[0], BACKWARD, self.keys)
+        return CursorPage(items, self, next_cursor, previous_cursor)
+
+    def _backward(self, position):
+        rows = self._rows(position, descending=False)
+        if len(rows) <= self.per_page:
+            # Дошли до начала ленты: отдаём полную первую страницу.
+            return self.page(None)
+        items = rows[:self.per_page][::-1]
+        return CursorPage(
+            items, self,
+            next_cursor=encode_cursor(items[-1], FORWARD, self.keys),
+            previous_cursor=encode_cursor(items[0], BACKWARD, self.keys),
+        )
+
+
+def numbered_page(object_list, per_page, number, keys=POST_KEYS):
+    """Обычная нумерованная страница ``Paginator``.
+
+    Если ``object_list`` сообщает ``truncated`` (счёт упёрся в лимит),
+    последняя страница получает ``next_cursor`` для продолжения курсором.
+    """
+    page = Paginator(object_list, per_page).get_page(number)
+    page.next_cursor = None
+    truncated = getattr(object_list, 'truncated', False)
+    if truncated and not page.has_next() and len(page):
+        page.next_cursor = encode_cursor(page[-1], FORWARD, keys)
+    return page
+
+
+def paginate(request, object_list, per_page=None, keys=POST_KEYS):
+    """Возвращает страницу ленты для запроса.
+
+    С параметром ``cursor`` работает курсорный режим, иначе — обычные
+    нумерованные страницы. Если выборка длиннее ``PAGINATOR_COUNT_LIMIT``,
+    последняя нумерованная страница получает ``next_cursor``, и дальше
+    навигация продолжается курсором.
+    """
+    per_page = per_page or settings.POSTS_PER_PAGE
+    object_list = object_list.order_by(*key_ordering(keys))
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        return CursorPaginator(object_list, per_page, keys).get_page(cursor)
+
+    bounded = BoundedCount(object_list, settings.PAGINATOR_COUNT_LIMIT)
+    return numbered_page(bounded, per_page, request.GET.get('page'), keys)
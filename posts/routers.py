@@ -0,0 +1,116 @@
+"""Чтение с реплик, запись в основную базу.
+
+Реплики — псевдонимы ``DATABASES`` из списка ``DATABASE_REPLICAS``;
+пустой список — всё в ``default``. С реплик читают только HTTP-запросы
+(``ReplicaMiddleware``), и то не всегда. Команды, сигналы вне запроса и
+миграции работают с основной базой.
+
+Чтение уходит в основную базу:
+
+* после первой записи в этом же запросе;
+* ``REPLICA_STICKY_SECONDS`` секунд после запроса, который писал: ответ
+  ставит cookie ``STICKY_COOKIE``, и автор сразу видит свою запись, даже
+  если реплика отстаёт (read-your-writes);
+* во view с декоратором ``use_primary`` и в админке, где форма читается
+  и сохраняется целиком, и в блоке ``with primary()``;
+* если области страницы в ``pagecache`` менялись недавно
+  (``read_from_primary``): страница с новым ETag не должна собираться
+  с реплики, которая изменения ещё не видела.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+STICKY_COOKIE = 'use_primary'
+
+_state = threading.local()
+
+
+def _replicas():
+    return settings.DATABASE_REPLICAS
+
+
+def read_from_primary():
+    """До конца запроса читать с основной базы."""
+    _state.replica_reads = False
+
+
+@contextmanager
+def primary():
+    """Чтения внутри блока — с основной базы."""
+    previous = getattr(_state, 'replica_reads', False)
+    _state.replica_reads = False
+    try:
+        yield
+    finally:
+        if not getattr(_state, 'wrote', False):
+            _state.replica_reads = previous
+
+
+def use_primary(view):
+    """Все чтения view — с основной базы."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        read_from_primary()
+        return view(request, *args, **kwargs)
+    wrapper.use_primary = True
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = _replicas()
+        if not replicas or not getattr(_state, 'replica_reads', False):
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Запись в запросе: дальше читаем своё.
+        _state.wrote = True
+        _state.replica_reads = False
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *_replicas()}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными.
+        if db in _replicas():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Включает чтение с реплик на время запроса и ставит cookie после
+    записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        _state.replica_reads = (bool(_replicas())
+                                and STICKY_COOKIE not in request.COOKIES)
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.wrote = False
+            _state.replica_reads = False
+        if wrote and _replicas():
+            response.set_cookie(STICKY_COOKIE, '1',
+                                max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if (getattr(view_func, 'use_primary', False)
+                or (match is not None and match.namespace == 'admin')):
+            read_from_primary()
@@ -0,0 +1,248 @@
+"""Полнотекстовый поиск по постам.
+
+Основной индекс — таблица SQLite FTS5 ``posts_search`` с внешним
+содержимым ``posts_post``. Её синхронизируют триггеры базы (см. миграцию
+``0015_search``), поэтому индекс не отстаёт и от массовой загрузки в
+обход сигналов. Ранжирование — ``bm25``, фрагмент с подсветкой —
+``snippet``.
+
+Если FTS5 в сборке SQLite нет (или ``SEARCH_FTS5 = False``), работает
+запасной индекс на Python: таблица ``SearchTerm`` (слово, пост, число
+вхождений) поддерживается сигналами, ранжирование — BM25 без поправки на
+длину текста.
+
+Слова запроса объединяются по «И». Выдача листается курсором по паре
+``(rank, id)``: меньший ранг — лучшее совпадение.
+"""
+import base64
+import binascii
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (Case, Count, ExpressionWrapper, F, FloatField,
+                              Q, Sum, Value, When)
+from django.utils.html import escape
+
+from .models import Post, SearchTerm
+
+FTS_TABLE = 'posts_search'
+MAX_TERMS = 10
+TERM_LENGTH = 64
+SNIPPET_TOKENS = 40
+SNIPPET_CHARS = 240
+# Насыщение частоты слова в BM25.
+K1 = 1.2
+BATCH_SIZE = 500
+# Границы подсветки: управляющие символы не встречаются в тексте поста
+# и переживают экранирование HTML.
+MARK_START, MARK_END = '\x02', '\x03'
+
+WORD = re.compile(r'\w+')
+
+
+def terms(text):
+    """Слова текста в нижнем регистре, как их видит индекс."""
+    return [word[:TERM_LENGTH] for word in WORD.findall(text.casefold())]
+
+
+def query_terms(query):
+    return list(dict.fromkeys(terms(query)))[:MAX_TERMS]
+
+
+@lru_cache(maxsize=None)
+def _fts_table_exists(database):
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def fts_enabled():
+    return settings.SEARCH_FTS5 and _fts_table_exists(
+        connection.settings_dict['NAME'])
+
+
+def encode_cursor(rank, pk):
+    raw = f'{rank!r}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """``(rank, pk)`` из токена; для повреждённого — ``None``."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        rank, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        return float(rank), int(pk)
+    except (ValueError, UnicodeError, binascii.Error):
+        return None
+
+
+def render_marks(fragment):
+    """Экранирует фрагмент и превращает границы подсветки в ``<mark>``."""
+    return (escape(fragment).replace(MARK_START, '<mark>')
+            .replace(MARK_END, '</mark>'))
+
+
+def _fts_rows(words, group_id, author_id, position, limit):
+    # Каждое слово в кавычках: пользовательский ввод не разбирается как
+    # синтаксис запроса FTS5.
+    match = ' '.join('"{}"'.format(word.replace('"', '""'))
+                     for word in words)
+    conditions, params = [f'{FTS_TABLE} MATCH %s'], [match]
+    if group_id is not None:
+        conditions.append('posts_post.group_id = %s')
+        params.append(group_id)
+    if author_id is not None:
+        conditions.append('posts_post.author_id = %s')
+        params.append(author_id)
+    seek = ''
+    if position is not None:
+        seek = 'WHERE rank > %s OR (rank = %s AND id > %s)'
+        params += [position[0], position[0], position[1]]
+    sql = f'''
+        SELECT id, rank, fragment FROM (
+            SELECT {FTS_TABLE}.rowid AS id, bm25({FTS_TABLE}) AS rank,
+                   snippet({FTS_TABLE}, 0, %s, %s, '…', %s) AS fragment
+            FROM {FTS_TABLE}
+            JOIN posts_post ON posts_post.id = {FTS_TABLE}.rowid
+            WHERE {' AND '.join(conditions)}
+        ) {seek}
+        ORDER BY rank, id LIMIT %s
+    '''
+    params = [MARK_START, MARK_END, SNIPPET_TOKENS, *params, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(pk, rank, render_marks(fragment))
+                for pk, rank, fragment in cursor.fetchall()]
+
+
+def _python_matches(words, group_id=None, author_id=None):
+    """Посты со всеми словами и их ранг: ``values('post_id', 'rank')``.
+
+    ``None``, если какого-то слова нет в индексе.
+    """
+    total = Post.objects.count()
+    frequencies = dict(SearchTerm.objects.filter(term__in=words)
+                       .values('term').annotate(posts=Count('post'))
+                       .values_list('term', 'posts'))
+    if len(frequencies) < len(words):
+        return None
+    weight = Case(*[
+        When(term=word, then=Value(math.log(
+            1 + (total - posts + 0.5) / (posts + 0.5))))
+        for word, posts in frequencies.items()
+    ], output_field=FloatField())
+    saturation = ExpressionWrapper(
+        F('count') * (K1 + 1) / (F('count') + K1), output_field=FloatField())
+    matches = SearchTerm.objects.filter(term__in=words)
+    if group_id is not None:
+        matches = matches.filter(post__group_id=group_id)
+    if author_id is not None:
+        matches = matches.filter(post__author_id=author_id)
+    return (matches.values('post_id')
+            .annotate(found=Count('term'), rank=-Sum(weight * saturation))
+            .filter(found=len(words)))
+
+
+def snippet(text, words):
+    """Фрагмент текста вокруг первого совпадения с подсветкой слов."""
+    pattern = re.compile(
+        r'\b(' + '|'.join(map(re.escape, words)) + r')\b', re.IGNORECASE)
+    found = pattern.search(text)
+    start = max(0, found.start() - SNIPPET_CHARS // 3) if found else 0
+    fragment = text[start:start + SNIPPET_CHARS]
+    marked = pattern.sub(lambda match: MARK_START + match[0] + MARK_END,
+                         fragment)
+    prefix = '…' if start else ''
+    suffix = '…' if start + SNIPPET_CHARS < len(text) else ''
+    return render_marks(prefix + marked + suffix)
+
+
+def _python_rows(words, group_id, author_id, position, limit):
+    matches = _python_matches(words, group_id, author_id)
+    if matches is None:
+        return []
+    if position is not None:
+        rank, pk = position
+        matches = matches.filter(Q(rank__gt=rank)
+                                 | Q(rank=rank, post_id__gt=pk))
+    rows = list(matches.order_by('rank', 'post_id')[:limit])
+    texts = Post.objects.in_bulk([row['post_id'] for row in rows])
+    return [(row['post_id'], row['rank'],
+             snippet(texts[row['post_id']].text, words)) for row in rows]
+
+
+def search(query, group_id=None, author_id=None, cursor=None, per_page=None):
+    """Страница выдачи: посты с ``search_rank``/``search_snippet`` и
+    курсор следующей страницы (или ``None``).
+    """
+    per_page = per_page or settings.POSTS_PER_PAGE
+    words = query_terms(query)
+    if not words:
+        return [], None
+    position = decode_cursor(cursor) if cursor else None
+    rows_for = _fts_rows if fts_enabled() else _python_rows
+    rows = rows_for(words, group_id, author_id, position, per_page + 1)
+    posts = Post.objects.for_feed().in_bulk(
+        [pk for pk, _, _ in rows[:per_page]])
+    results = []
+    for pk, rank, fragment in rows[:per_page]:
+        post = posts.get(pk)
+        if post is not None:
+            post.search_rank = rank
+            post.search_snippet = fragment
+            results.append(post)
+    next_cursor = None
+    if len(rows) > per_page:
+        pk, rank, _ = rows[per_page - 1]
+        next_cursor = encode_cursor(rank, pk)
+    return results, next_cursor
+
+
+def matching(query):
+    """Выражение для ``pk__in``: id всех постов, подходящих под запрос."""
+    words = query_terms(query)
+    if not words:
+        return Post.objects.none().values('pk')
+    if fts_enabled():
+        match = ' '.join('"{}"'.format(word.replace('"', '""'))
+                         for word in words)
+        return Post.objects.extra(
+            where=[f'posts_post.id IN (SELECT rowid FROM {FTS_TABLE} '
+                   f'WHERE {FTS_TABLE} MATCH %s)'],
+            params=[match]).values('pk')
+    matches = _python_matches(words)
+    if matches is None:
+        return Post.objects.none().values('pk')
+    return matches.values('post_id')
+
+
+def index_post(post):
+    """Переиндексирует пост в запасном индексе."""
+    with transaction.atomic():
+        SearchTerm.objects.filter(post=post).delete()
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, post=post, count=count)
+            for term, count in Counter(terms(post.text)).items())
+
+
+def rebuild():
+    """Собирает индекс заново по всем постам."""
+    if fts_enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) "
+                           f"VALUES ('rebuild')")
+        return
+    SearchTerm.objects.all().delete()
+    last_pk = 0
+    while True:
+        posts = list(Post.objects.filter(pk__gt=last_pk).order_by('pk')
+                     .only('pk', 'text')[:BATCH_SIZE])
+        if not posts:
+            return
+        last_pk = posts[-1].pk
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, post=post, count=count)
+            for post in posts
+            for term, count in Counter(terms(post.text)).items())
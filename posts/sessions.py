@@ -0,0 +1,14 @@
+"""Сессии в кеше с записью в базу (``cached_db``).
+
+Отличается от встроенного движка только префиксом ключа: в
+``tiercache`` префикс — первые части ключа через двоеточие, и у
+встроенного ``django.contrib.sessions.cached_db<ключ>`` каждая сессия
+была бы своим префиксом со своей версией и строкой статистики.
+"""
+from django.contrib.sessions.backends import cached_db
+
+KEY_PREFIX = 'sessions:cached_db:'
+
+
+class SessionStore(cached_db.SessionStore):
+    cache_key_prefix = KEY_PREFIX
@@ -0,0 +1,193 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import blobs, counters, objectcache, pagecache, search, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Поля пользователя, которые выводятся на страницах.
+PROFILE_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, raw=False, **kwargs):
+    """Новый пост попадает в ленты подписчиков автора."""
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_backfill(sender, instance, created, raw=False, **kwargs):
+    """После подписки в ленту дописываются посты автора."""
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_remove(sender, instance, **kwargs):
+    """После отписки посты автора уходят из ленты."""
+    timeline.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_invalidate_pages(sender, instance, **kwargs):
+    old_group_id = getattr(instance, '_loaded_group_id', None)
+    pagecache.bump(*pagecache.post_scopes(instance, old_group_id))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_invalidate_pages(sender, instance, **kwargs):
+    pagecache.bump(*pagecache.post_scopes(instance.post))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_invalidate_pages(sender, instance, **kwargs):
+    # Название группы выводится в карточке поста на любой странице.
+    pagecache.bump(pagecache.ALL)
+
+
+@receiver(pre_save, sender=User)
+def user_load_profile(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    # Вход сохраняет только last_login: страницы не меняются.
+    if raw or instance.pk is None or (
+            update_fields is not None
+            and not set(update_fields) & set(PROFILE_FIELDS)):
+        instance._loaded_profile = None
+        return
+    instance._loaded_profile = (User.objects.filter(pk=instance.pk)
+                                .values_list(*PROFILE_FIELDS).first())
+
+
+@receiver(post_save, sender=User)
+def user_invalidate_pages(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_profile', None)
+    if loaded is None:
+        return
+    old_username = loaded[0]
+    if loaded == tuple(getattr(instance, field)
+                       for field in PROFILE_FIELDS):
+        return
+    scopes = [pagecache.profile_scope(old_username),
+              pagecache.profile_scope(instance.username)]
+    if old_username != instance.username:
+        # Имя автора выводится в карточке поста на любой странице.
+        scopes.append(pagecache.ALL)
+    pagecache.bump(*scopes)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_invalidate_pages(sender, instance, **kwargs):
+    # Счётчики подписок в карточке автора.
+    pagecache.bump(pagecache.profile_scope(instance.user.username),
+                   pagecache.profile_scope(instance.author.username))
+
+
+@receiver(post_save, sender=Post)
+def post_count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def post_count_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, create_missing=False,
+                         posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_count_deleted(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.user_id, following_count=1)
+        counters.change_user(instance.author_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_count_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.user_id, create_missing=False,
+                         following_count=-1)
+    counters.change_user(instance.author_id, create_missing=False,
+                         followers_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_pull_mode(sender, instance, created, raw=False, **kwargs):
+    """Автор, набравший ``FEED_PULL_THRESHOLD`` подписчиков, переходит в
+    pull-режим; обратно — командой ``sync_feed_modes``."""
+    if created and not raw:
+        timeline.follower_added(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def post_image_references(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    name = instance.image.name or None
+    old_name = None if created else getattr(instance, '_loaded_image', None)
+    if name != old_name:
+        if name:
+            blobs.acquire(name)
+        if old_name:
+            blobs.release(old_name)
+    instance._loaded_image = name
+
+
+@receiver(post_delete, sender=Post)
+def post_image_release(sender, instance, **kwargs):
+    if instance.image:
+        blobs.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def post_search_index(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    # Индекс FTS5 обновляют триггеры базы; здесь — только запасной.
+    if raw or (update_fields is not None and 'text' not in update_fields):
+        return
+    if not search.fts_enabled():
+        search.index_post(instance)
+
+
+# Сброс кеша объектов — после остальных обработчиков: счётчик комментариев
+# к этому моменту уже обновлён в базе.
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_invalidate_object(sender, instance, **kwargs):
+    objectcache.users.invalidate(instance)
+    objectcache.session_users.invalidate(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_invalidate_object(sender, instance, **kwargs):
+    objectcache.groups.invalidate(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_invalidate_object(sender, instance, **kwargs):
+    objectcache.posts.invalidate(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_invalidate_post(sender, instance, **kwargs):
+    # comment_count поста.
+    objectcache.posts.invalidate(Post(pk=instance.post_id))
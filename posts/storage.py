@@ -0,0 +1,85 @@
+"""Хранилище картинок постов по хешу содержимого.
+
+Файл ложится по пути ``posts/ab/cd/abcd….jpg``, где ``abcd…`` — SHA-256
+содержимого, а ``ab`` и ``cd`` — его первые байты: в одной папке не
+оказываются сотни тысяч файлов. Одинаковое содержимое сохраняется один
+раз, повторное сохранение возвращает имя уже лежащего файла.
+
+Хеш загрузки считают обработчики загрузки по мере того, как приходят
+куски файла, поэтому перечитывать загрузку ради хеша не нужно.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import (MemoryFileUploadHandler,
+                                             TemporaryFileUploadHandler)
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+def content_digest(content):
+    """SHA-256 содержимого; для загрузки — посчитанный при приёме."""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def hashed_name(name, digest):
+    folder = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return os.path.join(folder, digest[:2], digest[2:4], digest + extension)
+
+
+def is_hashed(name):
+    """Лежит ли файл по адресу содержимого (а не по имени загрузки)."""
+    return bool(name) and HASHED_NAME.search(name) is not None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = hashed_name(name, content_digest(content))
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+image_storage = ContentAddressedStorage()
+
+
+class HashingUploadMixin:
+    """Считает SHA-256 загружаемого файла по мере приёма кусков."""
+
+    def new_file(self, *args, **kwargs):
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin,
+                                     MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin,
+                                        TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.admin import IndexedDatesQuerySet
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class PostAdminTest(TestCase):
+    """Список постов в админке не зависит от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.url = reverse('admin:posts_post_changelist')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def add_posts(self, count):
+        start = Post.objects.count()
+        for number in range(start, start + count):
+            author = User.objects.create_user(username=f'user_{number}')
+            Post.objects.create(text=f'Пост {number}', author=author,
+                                group=self.group)
+
+    def changelist_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_no_query_per_row(self):
+        self.add_posts(2)
+        # Прогрев: пользователь сессии читается из кеша со второго запроса.
+        self.changelist_queries()
+        few = len(self.changelist_queries())
+        self.add_posts(8)
+        self.assertEqual(len(self.changelist_queries()), few)
+
+    @override_settings(ADMIN_COUNT_LIMIT=5)
+    def test_counts_are_bounded(self):
+        self.add_posts(8)
+        counts = [sql for sql in self.changelist_queries()
+                  if 'COUNT(' in sql and 'posts_post' in sql]
+        self.assertTrue(counts)
+        for sql in counts:
+            self.assertIn('LIMIT 6', sql)
+        response = self.client.get(self.url)
+        # Без фильтров число строк оценено по MAX(id).
+        self.assertEqual(response.context['cl'].result_count,
+                         Post.objects.latest('pk').pk)
+
+    @override_settings(ADMIN_COUNT_LIMIT=5)
+    def test_filtered_count_stops_at_limit(self):
+        self.add_posts(8)
+        response = self.client.get(self.url, {'q': 'Пост'})
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+    def test_date_hierarchy(self):
+        self.add_posts(1)
+        post = Post.objects.get()
+        response = self.client.get(self.url,
+                                   {'pub_date__year': post.pub_date.year})
+        self.assertEqual(list(response.context['cl'].result_list), [post])
+
+    def test_autocomplete_widgets(self):
+        response = self.client.get(reverse('admin:posts_post_add'))
+        self.assertContains(response, 'data-ajax--url', count=2)
+
+    def test_dates_match_distinct_dates(self):
+        self.add_posts(5)
+        moments = [(2019, 12, 31, 23), (2020, 1, 1, 0), (2020, 1, 1, 5),
+                   (2020, 2, 29, 12), (2021, 7, 4, 8)]
+        for post, moment in zip(Post.objects.order_by('pk'), moments):
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=timezone.make_aware(datetime(*moment)))
+        indexed = IndexedDatesQuerySet(model=Post)
+        for kind in ('year', 'month', 'day'):
+            for order in ('ASC', 'DESC'):
+                self.assertEqual(
+                    indexed.dates('pub_date', kind, order),
+                    list(Post.objects.dates('pub_date', kind, order)))
+        year = indexed.filter(pub_date__year=2020)
+        self.assertEqual(year.dates('pub_date', 'month'),
+                         list(Post.objects.filter(pub_date__year=2020)
+                              .dates('pub_date', 'month')))
+
+    def test_date_hierarchy_seeks_index(self):
+        self.add_posts(3)
+        for sql in self.changelist_queries():
+            if 'MIN(' in sql or 'MAX(' in sql:
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    for row in cursor.fetchall():
+                        self.assertTrue(row[-1].startswith('SEARCH'), sql)
@@ -0,0 +1,156 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.metrics import budget_for
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author',
+                                              first_name='Лев')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.posts = [Post.objects.create(text=f'Пост {number}',
+                                         author=cls.author,
+                                         group=cls.group if number % 2
+                                         else None)
+                     for number in range(5)]
+        cls.post = cls.posts[-1]
+        for number in range(3):
+            Comment.objects.create(post=cls.post, author=cls.reader,
+                                   text=f'Комментарий {number}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, name, params=None, status=200, **kwargs):
+        response = self.client.get(reverse(name, kwargs=kwargs), params)
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def collect(self, name, params=None, **kwargs):
+        """Все страницы списка по ссылкам ``next``."""
+        data = self.get(name, params, **kwargs)
+        items = data['results']
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            items += data['results']
+        return items
+
+    def test_posts_newest_first_with_cursor(self):
+        items = self.collect('api_posts', {'limit': 2})
+        self.assertEqual([item['id'] for item in items],
+                         [post.pk for post in reversed(self.posts)])
+
+    def test_post_fields(self):
+        data = self.get('api_post', post_id=self.post.pk)
+        self.assertEqual(data['id'], self.post.pk)
+        self.assertEqual(data['author'], self.author.pk)
+        self.assertEqual(data['comment_count'], 3)
+        self.assertIsNone(data['image'])
+
+    def test_sparse_fields(self):
+        data = self.get('api_posts', {'fields': 'text'})
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+
+    def test_include(self):
+        data = self.get('api_posts', {'include': 'author,group',
+                                      'fields': 'author,group'})
+        newest, older = data['results'][:2]
+        self.assertEqual(newest['author'], {'id': self.author.pk,
+                                            'username': 'author',
+                                            'first_name': 'Лев',
+                                            'last_name': ''})
+        self.assertIsNone(newest['group'])
+        self.assertEqual(older['group']['slug'], 'group')
+
+    def test_bad_parameters(self):
+        for params in ({'fields': 'password'}, {'include': 'stats'},
+                       {'limit': 'many'}, {'limit': 1000},
+                       {'cursor': 'garbage'}):
+            with self.subTest(params=params):
+                data = self.get('api_posts', params, status=400)
+                self.assertIn('error', data)
+
+    def test_not_found(self):
+        self.get('api_post', status=404, post_id=10 ** 6)
+        self.get('api_group', status=404, slug='missing')
+        self.get('api_profile_posts', status=404, username='missing')
+
+    def test_filters(self):
+        items = self.collect('api_posts', {'group': 'group'})
+        self.assertEqual(len(items), 2)
+        self.assertEqual(self.collect('api_group_posts', slug='group'), items)
+        self.assertEqual(len(self.collect('api_profile_posts',
+                                          username='author')), 5)
+
+    def test_comments_oldest_first(self):
+        items = self.collect('api_comments', {'limit': 2},
+                             post_id=self.post.pk)
+        self.assertEqual([item['text'] for item in items],
+                         [f'Комментарий {number}' for number in range(3)])
+
+    def test_groups_and_profile(self):
+        self.assertEqual(self.get('api_groups')['results'][0]['slug'],
+                         'group')
+        data = self.get('api_profile', username='author')
+        self.assertEqual(data['posts_count'], 5)
+        self.assertEqual(data['followers_count'], 1)
+
+    def test_profile_without_activity(self):
+        User.objects.create_user(username='newcomer')
+        data = self.get('api_profile', username='newcomer')
+        self.assertEqual([data['posts_count'], data['followers_count'],
+                          data['following_count']], [0, 0, 0])
+
+    def test_feed(self):
+        self.get('api_feed', status=401)
+        self.client.force_login(self.reader)
+        items = self.collect('api_feed', {'limit': 2, 'fields': 'id'})
+        self.assertEqual([item['id'] for item in items],
+                         [post.pk for post in reversed(self.posts)])
+
+    def test_conditional_get(self):
+        url = reverse('api_post', kwargs={'post_id': self.post.pk})
+        first = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Ещё')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_query_budgets(self):
+        self.client.force_login(self.reader)
+        endpoints = {
+            'api_posts': {},
+            'api_post': {'post_id': self.post.pk},
+            'api_comments': {'post_id': self.post.pk},
+            'api_groups': {},
+            'api_group': {'slug': 'group'},
+            'api_group_posts': {'slug': 'group'},
+            'api_profile': {'username': 'author'},
+            'api_profile_posts': {'username': 'author'},
+            'api_feed': {},
+        }
+        for name, kwargs in endpoints.items():
+            with self.subTest(name=name):
+                cache.clear()
+                budget = budget_for(name)['queries']
+                url = reverse(name, kwargs=kwargs)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, {'include': 'author'}
+                                               if 'post' in name else {})
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(queries), budget)
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, TransactionTestCase
+from django.test import override_settings
+from django.urls import reverse
+
+from posts import thumbnails
+from posts.models import ImageBlob, Post
+from posts.storage import image_storage, is_hashed
+from posts.tests.test_thumbnails import image_file
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def media_files():
+    return sorted(os.path.relpath(os.path.join(folder, name), MEDIA_ROOT)
+                  for folder, _, names in os.walk(MEDIA_ROOT)
+                  for name in names)
+
+
+class BlobsMixin:
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        self.author = User.objects.create_user(username='author')
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def upload(self, name='image.png', text='Пост'):
+        self.client.post(reverse('new_post'),
+                         {'text': text, 'image': image_file(name)})
+        return Post.objects.latest('pk')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DeduplicationTest(BlobsMixin, TestCase):
+    def test_same_content_stored_once(self):
+        render = mock.Mock(wraps=thumbnails.render_variants)
+        with mock.patch.object(thumbnails, 'render_variants', render):
+            first = self.upload('first.png')
+            second = self.upload('second.png')
+        self.assertTrue(is_hashed(first.image.name))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_variants, second.image_variants)
+        self.assertEqual(second.image_width, first.image_width)
+        self.assertEqual(second.image_color, first.image_color)
+        self.assertEqual(render.call_count, 1)
+        originals = [name for name in media_files()
+                     if name.startswith('posts')]
+        self.assertEqual(originals, [first.image.name])
+        self.assertEqual(
+            ImageBlob.objects.get(name=first.image.name).references, 2)
+
+    def test_edit_moves_reference(self):
+        post = self.upload()
+        url = reverse('post_edit', kwargs={'username': 'author',
+                                           'post_id': post.pk})
+        self.client.post(url, {'text': 'Пост',
+                               'image': image_file(size=(200, 200))})
+        post.refresh_from_db()
+        self.assertEqual(ImageBlob.objects.get(name=post.image.name)
+                         .references, 1)
+        self.assertEqual(ImageBlob.objects.count(), 1)
+
+    def test_plain_create_counts_reference(self):
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   image=image_file())
+        self.assertTrue(image_storage.exists(post.image.name))
+        self.assertEqual(ImageBlob.objects.get(name=post.image.name)
+                         .references, 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ReleaseTest(BlobsMixin, TransactionTestCase):
+    def test_files_deleted_with_last_reference(self):
+        first = self.upload()
+        self.upload()
+        name = first.image.name
+        first.delete()
+        self.assertTrue(image_storage.exists(name))
+        self.author.delete()
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertEqual(media_files(), [])
@@ -1,10 +1,13 @@
+import time
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import TestCase, Client
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 
-from posts.models import Post, User, Group
+from posts import pagecache
+from posts.models import Comment, Group, Post, User
 
 
 class CacheTest(TestCase):
@@ -47,3 +50,227 @@ class CacheTest(TestCase):
         response = self.authorized_client.get(reverse('index'))
         current_post = response.context['page'][0]
         self.assertEqual(current_post, post, 'Caching is not working.')
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Название сообщества',
+            slug='test-group',
+            description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_anonymous_page_served_without_queries(self):
+        """Повторный запрос анонима отдаётся из кеша без обращения к БД."""
+        urls = (
+            reverse('index'),
+            reverse('group', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.guest_client.get(url)
+                self.assertEqual(first.content, second.content)
+
+    def test_write_invalidates_affected_pages(self):
+        url = reverse('group', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий')
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_moving_post_invalidates_old_group(self):
+        other = Group.objects.create(title='Другая', slug='other',
+                                     description='Описание')
+        url = reverse('group', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = other
+        post.save()
+        response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Тестовый пост')
+
+    def test_authorized_pages_are_not_cached(self):
+        client = Client()
+        client.force_login(self.user)
+        client.get(reverse('index'))
+        response = client.get(reverse('index'))
+        self.assertIsNotNone(response.context)
+
+    def lock(self, url, scope):
+        page = pagecache.CachedPage(RequestFactory().get(url), scope)
+        cache.add(page.lock_key, 1)
+
+    def test_stale_copy_served_while_locked(self):
+        """Пока страницу собирает другой воркер, отдаётся старая копия."""
+        url = reverse('index')
+        self.guest_client.get(url)
+        Post.objects.create(text='Новый пост', author=self.user)
+        self.lock(url, pagecache.INDEX)
+        saved = pagecache.stats()['saved']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Новый пост')
+        self.assertEqual(pagecache.stats()['saved'], saved + 1)
+        response = Client(REMOTE_ADDR='127.0.0.1').get(reverse('metrics'))
+        self.assertContains(response, 'yatube_page_cache_events_total'
+                                      f'{{event="saved"}} {saved + 1}')
+
+    @override_settings(PAGE_CACHE_LOCK_WAIT=0)
+    def test_locked_miss_renders_without_waiting_forever(self):
+        url = reverse('index')
+        self.lock(url, pagecache.INDEX)
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Тестовый пост')
+
+    @override_settings(PAGE_CACHE_EARLY_BETA=10 ** 9)
+    def test_early_expiry_regenerates(self):
+        url = reverse('index')
+        self.guest_client.get(url)
+        early = pagecache.stats()['early']
+        response = self.guest_client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertEqual(pagecache.stats()['early'], early + 1)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Название сообщества',
+            slug='test-group',
+            description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост',
+            author=cls.user,
+            group=cls.group,
+        )
+        cls.urls = (
+            reverse('index'),
+            reverse('group', kwargs={'slug': cls.group.slug}),
+            reverse('profile', kwargs={'username': cls.user.username}),
+            reverse('post', kwargs={'username': cls.user.username,
+                                    'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        # Отметки изменений старше секунды: иначе Last-Modified не отдаётся.
+        scopes = (pagecache.ALL, pagecache.INDEX,
+                  pagecache.group_scope(self.group.slug),
+                  pagecache.profile_scope(self.user.username))
+        cache.set_many({f'pages:modified:{scope}': time.time() - 10
+                        for scope in scopes}, None)
+
+    def test_unchanged_page_is_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(response.status_code, 304)
+                response = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_validators(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                Comment.objects.create(post=self.post, author=self.user,
+                                       text='Комментарий')
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_unrelated_write_keeps_validators(self):
+        url = reverse('group', kwargs={'slug': self.group.slug})
+        first = self.guest_client.get(url)
+        Post.objects.create(text='Пост без группы', author=self.user)
+        response = self.guest_client.get(url,
+                                         HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_profile_change_changes_validators(self):
+        url = reverse('profile', kwargs={'username': self.user.username})
+        first = self.guest_client.get(url)
+        self.user.first_name = 'Боб'
+        self.user.save()
+        response = self.guest_client.get(url,
+                                         HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Боб')
+
+    def test_rename_changes_validators(self):
+        user = User.objects.create_user(username='old')
+        Post.objects.create(text='Пост', author=user)
+        url = reverse('index')
+        first = self.guest_client.get(url)
+        user.username = 'new'
+        user.save()
+        response = self.guest_client.get(url,
+                                         HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertContains(response, '@new')
+
+    def test_login_keeps_validators(self):
+        url = reverse('profile', kwargs={'username': self.user.username})
+        first = self.guest_client.get(url)
+        Client().force_login(self.user)
+        response = self.guest_client.get(url,
+                                         HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_fresh_change_has_no_last_modified(self):
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.guest_client.get(reverse('index'))
+        self.assertTrue(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_authorized_validators_are_personal(self):
+        url = reverse('index')
+        anonymous = self.guest_client.get(url)
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(url, HTTP_IF_NONE_MATCH=anonymous['ETag'],
+                              HTTP_IF_MODIFIED_SINCE=anonymous[
+                                  'Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_login_changes_validators(self):
+        """После повторного входа форма со старым CSRF-токеном не
+        отдаётся из кеша браузера."""
+        url = self.urls[-1]
+        client = Client()
+        client.force_login(self.user)
+        client.get(url)
+        first = client.get(url)
+        response = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        # login() меняет секрет CSRF, а с ним и cookie.
+        client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 64
+        response = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,83 @@
+import random
+import shutil
+import tempfile
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+
+from posts import benchmark, urls
+from posts.dataset import Dataset, PowerLaw
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DatasetTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_records_are_reproducible(self):
+        first = list(Dataset(users=20, posts=50, seed=3).records())
+        second = list(Dataset(users=20, posts=50, seed=3).records())
+        other = list(Dataset(users=20, posts=50, seed=4).records())
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_power_law(self):
+        choose = PowerLaw(100, random.Random(1))
+        counts = Counter(choose() for _ in range(10000))
+        self.assertGreater(counts[0], 10 * counts[50])
+
+    def test_load(self):
+        written = Dataset(users=30, groups=3, posts=200, images=2,
+                          seed=1).load()
+        self.assertEqual(written['post'], 200)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertTrue(Follow.objects.exists())
+        with_image = Post.objects.exclude(image='').exclude(image=None)
+        self.assertTrue(with_image.exists())
+        self.assertFalse(with_image.filter(thumbnail_url='').exists())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Dataset(users=20, groups=2, posts=60, seed=1).load()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_run_covers_every_url(self):
+        posts = Post.objects.count()
+        results = benchmark.run(Client(), requests=2)
+        self.assertEqual(set(results),
+                         {pattern.name for pattern in urls.urlpatterns})
+        self.assertEqual(results['index']['status'], 200)
+        self.assertEqual(results['add_comment']['status'], 302)
+        self.assertLessEqual(results['index']['p50'],
+                             results['index']['p99'])
+        # Пишущие адреса откатываются.
+        self.assertEqual(Post.objects.count(), posts)
+
+    def test_compare_flags_regressions(self):
+        base = {'p50': 5, 'p95': 10, 'p99': 12, 'queries': 4}
+        baseline = {'1000': {'index': base, 'post': base}}
+        results = {'1000': {
+            'index': {**base, 'p95': 10.5},
+            'post': {**base, 'p95': 20, 'queries': 6},
+        }}
+        regressions = benchmark.compare(results, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(line.startswith('1000 post')
+                            for line in regressions))
@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+from posts import db
+
+
+class SqliteConnectionTest(SimpleTestCase):
+    # Соединения тестов свои, но запрет запросов в SimpleTestCase и
+    # pytest-django действует на любые соединения.
+    databases = {'default'}
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        handler = ConnectionHandler({'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory, 'db.sqlite3'),
+            'CONN_MAX_AGE': 600,
+        }})
+        self.connection = handler['default']
+        self.addCleanup(self.connection.close)
+
+    def pragma(self, name):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        # NORMAL
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 2 ** 10)
+
+    def test_broken_connection_is_reopened(self):
+        self.connection.ensure_connection()
+        alive = self.connection.connection
+        db.check_connection(self.connection)
+        self.assertIs(self.connection.connection, alive)
+        alive.close()
+        db.check_connection(self.connection)
+        self.assertIsNone(self.connection.connection)
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
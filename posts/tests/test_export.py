@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from posts import exporter
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.test_thumbnails import image_file
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Коты', slug='cats',
+                                     description='Описание')
+        cls.posts = [Post.objects.create(text=f'Пост {i}', author=cls.author,
+                                         group=group if i % 2 else None)
+                     for i in range(5)]
+        cls.image_post = Post.objects.create(text='С картинкой',
+                                             author=cls.author,
+                                             image=image_file())
+        Comment.objects.create(post=cls.posts[0], author=cls.reader,
+                               text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def path(self, suffix):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_chunks_use_keyset(self):
+        with self.assertNumQueries(3):
+            sizes = [len(rows) for rows in exporter.chunks(
+                Post.objects.all(), ('text',), chunk_size=3)]
+        self.assertEqual(sizes, [3, 3])
+
+    def test_round_trip(self):
+        output = self.path('.jsonl')
+        call_command('export_yatube', output=output, chunk_size=2,
+                     stderr=StringIO())
+        with open(output, encoding='utf-8') as stream:
+            records = [json.loads(line) for line in stream]
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['user'] * 2 + ['group'] + ['post'] * 6 + ['comment', 'follow'])
+        expected = list(Post.objects.order_by('pk').values_list(
+            'pk', 'author__username', 'group__slug', 'text', 'pub_date'))
+        Post.objects.all().delete()
+        call_command('import_yatube', output, stdout=StringIO())
+        self.assertEqual(list(Post.objects.order_by('pk').values_list(
+            'pk', 'author__username', 'group__slug', 'text', 'pub_date')),
+            expected)
+        self.assertEqual(Comment.objects.get().post_id, self.posts[0].pk)
+
+    def test_media_tar(self):
+        media = self.path('.tar')
+        call_command('export_yatube', output=self.path('.jsonl'),
+                     media=media, stderr=StringIO())
+        with tarfile.open(media) as archive:
+            self.assertEqual(archive.getnames(),
+                             [self.image_post.image.name])
+
+    def test_both_streams_to_stdout_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('export_yatube', media='-', stdout=StringIO(),
+                         stderr=StringIO())
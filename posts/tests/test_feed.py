@@ -0,0 +1,80 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+@override_settings(FEED_PULL_THRESHOLD=2, POSTS_PER_PAGE=3)
+class HybridFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.fan, author=cls.star)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+        self.posts = [
+            Post.objects.create(text=f'Пост {i}',
+                                author=(self.star, self.author)[i % 2])
+            for i in range(7)
+        ]
+
+    def test_popular_author_is_not_fanned_out(self):
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.star).exists())
+
+    def test_feed_merges_pushed_and_pulled_posts(self):
+        """Курсорные страницы ленты идут по убыванию даты без пропусков."""
+        seen = []
+        url = reverse('follow_index') + '?cursor='
+        while url:
+            page = self.client.get(url).context['page']
+            seen.extend(page)
+            url = (reverse('follow_index') + f'?cursor={page.next_cursor}'
+                   if page.has_next() else None)
+        self.assertEqual(seen, self.posts[::-1])
+
+    def test_numbered_feed_page(self):
+        response = self.client.get(reverse('follow_index') + '?page=3')
+        self.assertEqual(list(response.context['page']), [self.posts[0]])
+
+    def test_author_leaving_pull_mode_is_pushed(self):
+        """Посты, вышедшие в pull-режиме, не пропадают из ленты: до
+        ``sync_feed_modes`` автор читается как раньше, после — из ленты."""
+        Follow.objects.get(user=self.fan, author=self.star).delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.star).exists())
+        first_page = self.posts[::-1][:3]
+        response = self.client.get(reverse('follow_index') + '?page=1')
+        self.assertEqual(list(response.context['page']), first_page)
+        call_command('sync_feed_modes', stdout=StringIO())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader,
+                                         author=self.star).count(), 4)
+        self.assertFalse(UserStats.objects.get(user=self.star).feed_pulled)
+        response = self.client.get(reverse('follow_index') + '?page=1')
+        self.assertEqual(list(response.context['page']), first_page)
+        post = Post.objects.create(text='Снова push', author=self.star)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+
+    def test_reaching_threshold_switches_to_pull(self):
+        Follow.objects.create(user=self.star, author=self.author)
+        self.assertTrue(UserStats.objects.get(user=self.author).feed_pulled)
+        post = Post.objects.create(text='Уже pull', author=self.author)
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=post).exists())
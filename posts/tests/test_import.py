@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.models import (Comment, Follow, Group, ImageBlob, Post,
+                          TimelineEntry)
+from posts.models import UserStats
+
+User = get_user_model()
+
+RECORDS = [
+    {'type': 'user', 'username': 'author'},
+    {'type': 'user', 'username': 'reader'},
+    {'type': 'group', 'slug': 'cats', 'title': 'Коты'},
+    {'type': 'post', 'id': 10, 'author': 'author', 'group': 'cats',
+     'text': 'Первый', 'pub_date': '2020-01-01T10:00:00'},
+    {'type': 'post', 'id': 11, 'author': 'author', 'text': 'Второй',
+     'pub_date': '2020-01-02T10:00:00+00:00'},
+    {'type': 'post', 'author': 'nobody', 'text': 'Без автора'},
+    {'type': 'comment', 'post': 10, 'author': 'reader', 'text': 'Мяу',
+     'created': '2020-01-03T10:00:00'},
+    {'type': 'comment', 'post': 999, 'author': 'reader', 'text': 'Мимо'},
+    {'type': 'follow', 'user': 'reader', 'author': 'author'},
+]
+
+
+class ImportTest(TestCase):
+    def write(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def load(self, *args):
+        out = StringIO()
+        call_command('import_yatube', *args, batch_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_jsonl_import(self):
+        path = self.write('.jsonl', '\n'.join(map(json.dumps, RECORDS)))
+        output = self.load(path)
+        self.assertIn('post: записано 2, пропущено 1', output)
+        self.assertIn('comment: записано 1, пропущено 1', output)
+        self.assertEqual(Group.objects.get().slug, 'cats')
+        first = Post.objects.get(pk=10)
+        self.assertEqual(first.pub_date,
+                         datetime(2020, 1, 1, 10, tzinfo=timezone.utc))
+        self.assertEqual(first.comment_count, 1)
+        self.assertEqual(Comment.objects.get().created.day, 3)
+        reader = User.objects.get(username='reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertTrue(Follow.objects.filter(user=reader).exists())
+        self.assertEqual(UserStats.objects.get(user__username='author')
+                         .followers_count, 1)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=reader)
+                 .values_list('post_id', flat=True)), [11, 10])
+        # Даты снова проставляются автоматически.
+        post = Post.objects.create(text='Новый', author=reader)
+        self.assertGreater(post.pub_date, first.pub_date)
+
+    def test_csv_import_is_idempotent(self):
+        User.objects.create_user(username='author')
+        path = self.write('.csv', 'id,author,text\n1,author,Раз\n'
+                                  '2,author,"Два, три"\n')
+        self.load(path, '--type', 'post')
+        output = self.load(path, '--type', 'post')
+        self.assertIn('post: записано 0', output)
+        self.assertEqual(list(Post.objects.order_by('pk')
+                              .values_list('text', flat=True)),
+                         ['Раз', 'Два, три'])
+        self.assertEqual(UserStats.objects.get().posts_count, 2)
+
+    def test_imported_images_hold_blob_references(self):
+        author = User.objects.create_user(username='author')
+        name = 'posts/2e/53/' + '2e53' * 16 + '.png'
+        existing = Post.objects.create(text='Свой', author=author,
+                                       image=name)
+        record = {'type': 'post', 'author': 'author', 'text': 'Чужой',
+                  'image': name}
+        self.load(self.write('.jsonl', json.dumps(record)))
+        self.assertEqual(ImageBlob.objects.get(name=name).references, 2)
+        existing.delete()
+        self.assertEqual(ImageBlob.objects.get(name=name).references, 1)
+
+    def test_invalid_record(self):
+        path = self.write('.jsonl', '{"type": "unknown"}\n')
+        with self.assertRaises(CommandError):
+            self.load(path)
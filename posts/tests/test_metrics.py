@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.metrics import registry
+from posts.models import Post
+
+User = get_user_model()
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def setUp(self):
+        registry.clear()
+        self.client.force_login(self.user)
+
+    def test_view_metrics_are_exported(self):
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        for line in ('yatube_view_queries_count{view="index"} 1',
+                     'yatube_view_latency_seconds_count{view="index"} 1',
+                     'yatube_view_template_seconds_count{view="index"} 1',
+                     'yatube_view_queries_bucket{view="index",le="+Inf"} 1'):
+            with self.subTest(line=line):
+                self.assertContains(response, line)
+
+    @override_settings(METRICS_BUDGETS={'index': {'queries': 0}})
+    def test_budget_violation_is_logged(self):
+        with self.assertLogs('yatube.metrics', 'WARNING'):
+            self.client.get(reverse('index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(
+            response, 'yatube_view_budget_violations_total'
+                      '{view="index",kind="queries"} 1')
+
+    def test_metrics_hidden_from_public(self):
+        self.client.logout()
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    def test_cache_events_are_exported(self):
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(response, 'yatube_cache_events_total{prefix=')
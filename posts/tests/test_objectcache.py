@@ -0,0 +1,140 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import objectcache
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ObjectCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        objectcache.reset_stats()
+
+    def test_lookups_are_read_through(self):
+        lookups = ((objectcache.users, 'author', self.author),
+                   (objectcache.groups, 'group', self.group),
+                   (objectcache.posts, self.post.pk, self.post))
+        for object_cache, value, expected in lookups:
+            with self.subTest(model=object_cache.name):
+                self.assertEqual(object_cache.get(value), expected)
+                with self.assertNumQueries(0):
+                    self.assertEqual(object_cache.get(value), expected)
+        stats = objectcache.stats()
+        self.assertEqual(stats['user']['hits'], 1)
+        self.assertEqual(stats['user']['misses'], 1)
+        self.assertEqual(stats['user']['hit_ratio'], 0.5)
+
+    def test_related_objects_are_not_cached(self):
+        objectcache.posts.get(self.post.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(objectcache.posts.get(self.post.pk).group,
+                             self.group)
+
+    def test_missing_objects_are_cached_briefly(self):
+        self.assertIsNone(objectcache.users.get('ghost'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(objectcache.users.get('ghost'))
+        self.assertEqual(objectcache.stats()['user']['negative_hits'], 1)
+        ghost = User.objects.create_user(username='ghost')
+        self.assertEqual(objectcache.users.get('ghost'), ghost)
+
+    def test_saves_invalidate(self):
+        objectcache.groups.get('group')
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertEqual(objectcache.groups.get('group').title,
+                         'Новое название')
+        objectcache.posts.get(self.post.pk)
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Комментарий')
+        self.assertEqual(objectcache.posts.get(self.post.pk).comment_count, 1)
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.assertIsNone(objectcache.posts.get(self.post.pk))
+
+    def test_invalidation_during_read_is_not_cached(self):
+        """Старая версия, прочитанная до сброса, в кеш не возвращается."""
+        read = objectcache._without_related
+
+        def racing(instance):
+            Comment.objects.create(post=self.post, author=self.author,
+                                   text='Комментарий')
+            return read(instance)
+
+        with mock.patch.object(objectcache, '_without_related', racing):
+            self.assertEqual(
+                objectcache.posts.get(self.post.pk).comment_count, 0)
+        self.assertEqual(objectcache.posts.get(self.post.pk).comment_count, 1)
+
+    def test_edit_keeps_comment_count(self):
+        objectcache.posts.get(self.post.pk)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=5)
+        client = Client()
+        client.force_login(self.author)
+        client.post(reverse('post_edit', kwargs={'username': 'author',
+                                                 'post_id': self.post.pk}),
+                    {'text': 'Исправленный пост'})
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, 'Исправленный пост')
+        self.assertEqual(post.comment_count, 5)
+
+    def test_rename_forgets_old_value(self):
+        user = User.objects.create_user(username='old')
+        objectcache.users.get('old')
+        user.username = 'new'
+        user.save()
+        self.assertIsNone(objectcache.users.get('old'))
+        self.assertEqual(objectcache.users.get('new'), user)
+
+    def test_clear(self):
+        objectcache.posts.get(self.post.pk)
+        Post.objects.filter(pk=self.post.pk).update(text='В обход сигналов')
+        objectcache.clear()
+        self.assertEqual(objectcache.posts.get(self.post.pk).text,
+                         'В обход сигналов')
+
+    def test_views_resolve_objects_from_cache(self):
+        client = Client()
+        client.force_login(self.author)
+        urls = [reverse('profile_follow', kwargs={'username': 'author'}),
+                reverse('post_edit', kwargs={'username': 'author',
+                                             'post_id': self.post.pk})]
+        for url in urls:
+            with self.subTest(url=url):
+                client.get(url)
+                objectcache.reset_stats()
+                client.get(url)
+                self.assertEqual(objectcache.stats()['user']['misses']
+                                 + objectcache.stats()['post']['misses'], 0)
+
+    def test_views_keep_not_found(self):
+        client = Client()
+        client.force_login(User.objects.create_user(username='reader'))
+        for url in (reverse('post_edit', kwargs={'username': 'author',
+                                                 'post_id': self.post.pk}),
+                    reverse('profile_follow', kwargs={'username': 'ghost'}),
+                    reverse('post', kwargs={'username': 'author',
+                                            'post_id': 10 ** 6})):
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url).status_code, 404)
+
+    def test_hit_ratio_on_metrics(self):
+        objectcache.groups.get('group')
+        objectcache.groups.get('group')
+        client = Client(REMOTE_ADDR='127.0.0.1')
+        response = client.get(reverse('metrics'))
+        self.assertContains(
+            response, 'yatube_object_cache_hit_ratio{model="group"} 0.5')
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
-
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from posts.models import Group, Post
 
@@ -30,6 +32,10 @@ class PaginatorViewsTest(TestCase):
                 group=cls.group,
             )
 
+    def setUp(self):
+        # Страницы для анонимов кешируются целиком, без контекста шаблона.
+        cache.clear()
+
     def test_first_page_containse_ten_records(self):
         response = self.client.get(reverse('index'))
         self.assertEqual(len(response.context.get('page').object_list), 10)
@@ -38,3 +44,49 @@ class PaginatorViewsTest(TestCase):
         # Проверка: на второй странице должно быть три поста.
         response = self.client.get(reverse('index') + '?page=2')
         self.assertEqual(len(response.context.get('page').object_list), 3)
+
+    def test_cursor_pages_cover_all_posts(self):
+        """Курсорная навигация проходит все посты без повторов."""
+        seen = []
+        url = reverse('index') + '?cursor='
+        while url:
+            response = self.client.get(url)
+            page = response.context.get('page')
+            seen.extend(post.pk for post in page)
+            url = (reverse('index') + f'?cursor={page.next_cursor}'
+                   if page.has_next() else None)
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_cursor_previous_returns_same_page(self):
+        first = self.client.get(reverse('index') + '?cursor=')
+        second = self.client.get(
+            reverse('index') + f'?cursor={first.context["page"].next_cursor}')
+        back = self.client.get(
+            reverse('index')
+            + f'?cursor={second.context["page"].previous_cursor}')
+        self.assertEqual(list(back.context['page']),
+                         list(first.context['page']))
+
+    def test_cursor_page_has_no_count_query(self):
+        """Курсорная страница — один запрос к постам, без COUNT."""
+        first = self.client.get(reverse('index') + '?cursor=')
+        cursor = first.context['page'].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('index') + f'?cursor={cursor}')
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('__count', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    @override_settings(PAGINATOR_COUNT_LIMIT=10)
+    def test_numbered_pages_hand_over_to_cursor(self):
+        """За пределом COUNT-лимита нумерация переходит в курсор."""
+        response = self.client.get(reverse('index'))
+        page = response.context.get('page')
+        self.assertFalse(page.has_next())
+        self.assertIsNotNone(page.next_cursor)
+        response = self.client.get(
+            reverse('index') + f'?cursor={page.next_cursor}')
+        self.assertEqual(len(response.context.get('page')), 3)
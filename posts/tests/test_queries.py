@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import objectcache
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryCountTest(TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(text=f'Пост {i}', author=self.author,
+                                       group=self.group)
+            Comment.objects.create(post=post, author=self.reader,
+                                   text='Комментарий')
+        return post
+
+    def count_queries(self, url):
+        # Холодный кеш объектов: с тёплым запросов только меньше.
+        objectcache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feed_query_counts_are_fixed(self):
+        post = self.add_posts(1)
+        urls = {
+            'index': (reverse('index'), 3),
+            'group': (reverse('group', kwargs={'slug': self.group.slug}), 4),
+            'profile': (reverse('profile',
+                                kwargs={'username': self.author.username}),
+                        5),
+            'follow_index': (reverse('follow_index'), 4),
+            'post': (reverse('post', kwargs={
+                'username': self.author.username, 'post_id': post.pk}), 4),
+        }
+        for name, (url, expected) in urls.items():
+            with self.subTest(view=name, posts=1):
+                self.assertEqual(self.count_queries(url), expected)
+        self.add_posts(9)
+        for name, (url, expected) in urls.items():
+            with self.subTest(view=name, posts=10):
+                self.assertEqual(self.count_queries(url), expected)
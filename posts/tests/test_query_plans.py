@@ -0,0 +1,91 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Полный проход по таблице в плане SQLite: «SCAN posts_post» без индекса
+# (в старых версиях — «SCAN TABLE posts_post»).
+# Проход по материализованному подзапросу («SCAN subquery») ограничен
+# его LIMIT, поэтому учитываются только настоящие таблицы.
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?P<table>\w+)\b(?! USING)')
+# Сортировка во временном дереве: порядок ленты не взят из индекса.
+SORT = re.compile(r'^USE TEMP B-TREE FOR .*ORDER BY')
+
+
+class QueryPlanTest(TestCase):
+    """Запросы страниц не сканируют таблицы целиком и не сортируют."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.reader,
+                               text='Комментарий')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def plan_problems(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        problems = []
+        tables = set(connection.introspection.table_names())
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    match = FULL_SCAN.match(detail)
+                    if (match and match['table'] in tables
+                            or SORT.match(detail)):
+                        problems.append((detail, query['sql']))
+        return problems
+
+    def test_views_use_indexes(self):
+        urls = {
+            'index': reverse('index'),
+            'group': reverse('group', kwargs={'slug': self.group.slug}),
+            'profile': reverse('profile',
+                               kwargs={'username': self.author.username}),
+            'follow_index': reverse('follow_index'),
+            'post': reverse('post', kwargs={
+                'username': self.author.username,
+                'post_id': self.post.pk}),
+        }
+        for name, url in urls.items():
+            with self.subTest(view=name):
+                self.assertEqual(self.plan_problems(url), [])
+
+    def test_api_uses_indexes(self):
+        urls = {
+            'api_posts': reverse('api_posts'),
+            'api_posts?group': reverse('api_posts') + '?group=group',
+            'api_posts?author': reverse('api_posts') + '?author=author',
+            'api_comments': reverse('api_comments',
+                                    kwargs={'post_id': self.post.pk}),
+            'api_group_posts': reverse('api_group_posts',
+                                       kwargs={'slug': self.group.slug}),
+            'api_profile_posts': reverse(
+                'api_profile_posts',
+                kwargs={'username': self.author.username}),
+            'api_feed': reverse('api_feed'),
+        }
+        for name, url in urls.items():
+            with self.subTest(view=name):
+                self.assertEqual(self.plan_problems(url), [])
@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import (Client, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import routers
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class RouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.PrimaryReplicaRouter()
+        routers._state.wrote = False
+        routers._state.replica_reads = True
+        self.addCleanup(routers.read_from_primary)
+
+    def test_reads_go_to_replica_until_write(self):
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+        with routers.primary():
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+    def test_outside_requests_reads_use_primary(self):
+        routers._state.replica_reads = False
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=0)
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+        self.post = Post.objects.create(text='Пост', author=self.user)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def replica_queries(self, url, method='get', data=None):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 400)
+        return response, len(queries)
+
+    def test_feed_reads_from_replica(self):
+        response, count = self.replica_queries(reverse('index'))
+        self.assertGreater(count, 0)
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+    def test_writer_sticks_to_primary(self):
+        response, _ = self.replica_queries(reverse('new_post'), 'post',
+                                           {'text': 'Новый пост'})
+        self.assertIn(routers.STICKY_COOKIE, response.cookies)
+        _, count = self.replica_queries(reverse('index'))
+        self.assertEqual(count, 0)
+        self.client.cookies.pop(routers.STICKY_COOKIE)
+        _, count = self.replica_queries(reverse('index'))
+        self.assertGreater(count, 0)
+
+    def test_forced_primary_view(self):
+        _, count = self.replica_queries(reverse('post_edit', kwargs={
+            'username': 'author', 'post_id': self.post.pk}))
+        self.assertEqual(count, 0)
+
+    @override_settings(REPLICA_STICKY_SECONDS=60)
+    def test_recently_changed_pages_read_primary(self):
+        _, count = self.replica_queries(reverse('index'))
+        self.assertEqual(count, 0)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_cookie_without_replicas(self):
+        response, count = self.replica_queries(
+            reverse('new_post'), 'post', {'text': 'Новый пост'})
+        self.assertEqual(count, 0)
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
@@ -0,0 +1,135 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.importer import Importer
+from posts.models import Group, Post, SearchTerm
+
+User = get_user_model()
+
+
+class SearchMixin:
+    """Общие проверки для индекса FTS5 и запасного индекса."""
+
+    def setUp(self):
+        self.client = Client()
+        self.author = User.objects.create_user(username='author')
+        self.other = User.objects.create_user(username='other')
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='Описание')
+        self.cats = Post.objects.create(
+            text='Кошки любят спать. Кошки, кошки!', author=self.author,
+            group=self.group)
+        self.dogs = Post.objects.create(
+            text='Собаки любят гулять и немного кошки', author=self.other)
+        self.words = Post.objects.create(
+            text='Про <script>кошки</script>', author=self.other)
+
+    def ids(self, query, **kwargs):
+        results, _ = search.search(query, **kwargs)
+        return [post.pk for post in results]
+
+    def test_ranked_by_relevance(self):
+        self.assertEqual(self.ids('кошки')[0], self.cats.pk)
+        self.assertCountEqual(self.ids('кошки'),
+                              [self.cats.pk, self.dogs.pk, self.words.pk])
+
+    def test_all_words_required(self):
+        self.assertEqual(self.ids('любят гулять'), [self.dogs.pk])
+        self.assertEqual(self.ids('кошки жирафы'), [])
+        self.assertEqual(self.ids(''), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.ids('"гулять* ('), [self.dogs.pk])
+
+    def test_filters(self):
+        self.assertEqual(self.ids('кошки', group_id=self.group.pk),
+                         [self.cats.pk])
+        self.assertCountEqual(self.ids('кошки', author_id=self.other.pk),
+                              [self.dogs.pk, self.words.pk])
+
+    def test_cursor_pages(self):
+        first, cursor = search.search('кошки', per_page=2)
+        self.assertEqual(len(first), 2)
+        second, last = search.search('кошки', per_page=2, cursor=cursor)
+        self.assertIsNone(last)
+        self.assertCountEqual(
+            [post.pk for post in first + second],
+            [self.cats.pk, self.dogs.pk, self.words.pk])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        results, _ = search.search('кошки', author_id=self.other.pk)
+        snippets = {post.pk: post.search_snippet for post in results}
+        self.assertIn('<mark>кошки</mark>', snippets[self.dogs.pk])
+        self.assertIn('&lt;script&gt;', snippets[self.words.pk])
+        self.assertNotIn('<script>', snippets[self.words.pk])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.dogs.text = 'Собаки любят гулять'
+        self.dogs.save()
+        self.assertNotIn(self.dogs.pk, self.ids('кошки'))
+        self.cats.delete()
+        self.assertEqual(self.ids('кошки'), [self.words.pk])
+
+    def test_bulk_import_is_searchable(self):
+        loader = Importer()
+        loader.run([{'type': 'post', 'author': 'author',
+                     'text': 'Импортированный жираф'}])
+        loader.finish(timelines=False)
+        self.assertEqual(len(self.ids('жираф')), 1)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:posts_post_changelist'),
+                                   {'q': 'гулять'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.dogs])
+
+    def test_view(self):
+        response = self.client.get(reverse('search'),
+                                   {'q': 'кошки', 'author': 'other'})
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual(
+            [post.pk for post in response.context['results']],
+            [self.dogs.pk, self.words.pk])
+        self.assertContains(response, '<mark>кошки</mark>')
+
+    def test_view_unknown_filter(self):
+        response = self.client.get(reverse('search'),
+                                   {'q': 'кошки', 'group': 'missing'})
+        self.assertEqual(response.context['results'], [])
+
+    @override_settings(POSTS_PER_PAGE=1)
+    def test_view_next_page_keeps_filters(self):
+        response = self.client.get(reverse('search'),
+                                   {'q': 'кошки', 'author': 'other'})
+        next_query = response.context['next_query']
+        self.assertIn('author=other', next_query)
+        response = self.client.get(reverse('search') + '?' + next_query)
+        self.assertEqual(len(response.context['results']), 1)
+        self.assertIsNone(response.context['next_query'])
+
+    def test_bad_cursor_starts_over(self):
+        results, _ = search.search('кошки', cursor='not-a-cursor')
+        self.assertEqual(len(results), 3)
+
+
+class FtsSearchTest(SearchMixin, TestCase):
+    def test_backend(self):
+        self.assertTrue(search.fts_enabled())
+        self.assertFalse(SearchTerm.objects.exists())
+
+
+@override_settings(SEARCH_FTS5=False)
+class FallbackSearchTest(SearchMixin, TestCase):
+    def test_backend(self):
+        self.assertFalse(search.fts_enabled())
+        self.assertEqual(
+            SearchTerm.objects.get(post=self.cats, term='кошки').count, 3)
+
+    def test_rebuild(self):
+        SearchTerm.objects.all().delete()
+        search.rebuild()
+        self.assertEqual(self.ids('гулять'), [self.dogs.pk])
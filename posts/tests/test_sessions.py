@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import benchmark
+from posts.sessions import KEY_PREFIX
+
+User = get_user_model()
+
+
+class CachedSessionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader',
+                                            password='old-password')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse('new_post')
+
+    def test_session_and_user_come_from_cache(self):
+        self.assertIsNotNone(
+            cache.get(KEY_PREFIX + self.client.session.session_key))
+        # Подписка на самого себя ничего не пишет.
+        url = reverse('profile_follow', kwargs={'username': 'reader'})
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_password_change_ends_other_sessions(self):
+        self.client.get(self.url)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password')
+        user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_deactivated_user_is_logged_out(self):
+        self.client.get(self.url)
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_benchmark_shows_fewer_queries(self):
+        results = benchmark.compare_auth(self.user, requests=2)
+        for name in benchmark.AUTH_VIEWS:
+            with self.subTest(name=name):
+                self.assertEqual(results['cached'][name]['queries'],
+                                 results['db'][name]['queries'] - 2)
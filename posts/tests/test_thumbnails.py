@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_file(name='image.png', size=(400, 300)):
+    content = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(content, 'png')
+    return SimpleUploadedFile(name, content.getvalue(),
+                              content_type='image/png')
+
+
+def jpeg_with_exif(name='photo.jpg'):
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera'
+    content = BytesIO()
+    Image.new('RGB', (400, 300)).save(content, 'jpeg', exif=exif.tobytes())
+    return SimpleUploadedFile(name, content.getvalue(),
+                              content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def create_post(self):
+        self.client.post(reverse('new_post'),
+                         {'text': 'Пост', 'image': image_file()})
+        return Post.objects.get()
+
+    def test_thumbnail_created_on_upload(self):
+        post = self.create_post()
+        self.assertTrue(post.thumbnail_url)
+        self.assertEqual((post.thumbnail_width, post.thumbnail_height),
+                         (960, 339))
+        manifest = json.loads(post.image_variants)
+        widths = {variant['width'] for variant in manifest
+                  if variant['type'] == 'image/jpeg'}
+        self.assertEqual(widths, set(thumbnails.WIDTHS))
+        self.assertIn('image/webp',
+                      {variant['type'] for variant in manifest})
+
+    def test_size_and_placeholder_stored(self):
+        post = self.create_post()
+        self.assertEqual((post.image_width, post.image_height), (400, 300))
+        self.assertEqual(post.image_color, '#c81e1e')
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'background-color: #c81e1e')
+
+    def test_original_recompressed_without_metadata(self):
+        self.client.post(reverse('new_post'),
+                         {'text': 'Пост', 'image': jpeg_with_exif()})
+        post = Post.objects.get()
+        with Image.open(post.image.path) as original:
+            self.assertEqual(original.format, 'JPEG')
+            self.assertNotIn('exif', original.info)
+
+    def test_feed_emits_srcset(self):
+        post = self.create_post()
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'sizes="')
+        self.assertContains(response, f'{post.thumbnail_url} 960w')
+
+    def test_feed_does_not_touch_thumbnail_backend(self):
+        post = self.create_post()
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend.get_thumbnail',
+                        side_effect=AssertionError('миниатюра в ленте')):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, post.thumbnail_url)
+
+    def test_edit_clears_and_replaces_thumbnail(self):
+        post = self.create_post()
+        url = reverse('post_edit', kwargs={'username': 'author',
+                                           'post_id': post.pk})
+        self.client.post(url, {'text': 'Пост', 'image-clear': 'on'})
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail_url, '')
+        self.assertEqual(post.image_variants, '')
+        self.client.post(url, {'text': 'Пост',
+                               'image': image_file('other.png')})
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail_url)
+
+    def test_backfill_command(self):
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   image=image_file())
+        self.assertEqual(post.thumbnail_url, '')
+        call_command('generate_thumbnails', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail_url)
+        self.assertEqual(post.image_width, 400)
+
+    def test_rebuild_overwrites_variants(self):
+        self.create_post()
+
+        def variant_files():
+            return sorted(
+                os.path.join(path, name) for path, _, names
+                in os.walk(os.path.join(MEDIA_ROOT, 'thumbnails'))
+                for name in names)
+
+        files = variant_files()
+        for _ in range(2):
+            call_command('generate_thumbnails', '--all', stdout=StringIO())
+            self.assertEqual(variant_files(), files)
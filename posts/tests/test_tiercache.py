@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from posts import tiercache
+
+
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.addCleanup(tiercache._shared.pop, self.location, None)
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return tiercache.TieredCache(self.location, {'OPTIONS': {
+            'SYNC_INTERVAL': 3600, **options}})
+
+    def forget_l1(self):
+        """Состояние процесса как у только что запущенного воркера."""
+        tiercache._shared.pop(self.location)
+        self.cache = self.make_cache()
+
+    def in_other_worker(self, target, *args, processes=1):
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=target, args=(self.location, *args))
+                   for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+    def test_basic_operations(self):
+        cache = self.cache
+        self.assertIsNone(cache.get('a:b'))
+        cache.set('a:b', {'value': 1})
+        self.assertEqual(cache.get('a:b'), {'value': 1})
+        self.assertFalse(cache.add('a:b', 2))
+        self.assertTrue(cache.add('a:c', 2))
+        self.assertEqual(cache.incr('a:c', 3), 5)
+        self.assertEqual(cache.get_many(['a:b', 'a:c', 'a:d']),
+                         {'a:b': {'value': 1}, 'a:c': 5})
+        with self.assertRaises(ValueError):
+            cache.incr('a:d')
+        cache.delete('a:b')
+        self.assertFalse(cache.has_key('a:b'))
+        cache.clear()
+        self.assertIsNone(cache.get('a:c'))
+
+    def test_values_survive_in_shared_store(self):
+        self.cache.set('a:b', 1)
+        self.forget_l1()
+        self.assertEqual(self.cache.get('a:b'), 1)
+        self.assertEqual(self.cache.stats()['a:b']['l2_hits'], 1)
+        self.assertEqual(self.cache.get('a:b'), 1)
+        self.assertEqual(self.cache.stats()['a:b']['l1_hits'], 1)
+
+    def test_expiry(self):
+        self.cache.set('a:b', 1, timeout=0)
+        self.assertIsNone(self.cache.get('a:b'))
+        self.cache.set('a:c', 1, timeout=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('a:c'))
+        self.assertTrue(self.cache.add('a:c', 2))
+
+    def test_l1_returns_copies(self):
+        self.cache.set('a:b', [1])
+        self.cache.get('a:b').append(2)
+        self.assertEqual(self.cache.get('a:b'), [1])
+
+    def test_l1_is_bounded(self):
+        cache = self.make_cache(L1_MAX_ENTRIES=2)
+        for number in range(3):
+            cache.set(f'a:{number}', number)
+        self.assertEqual(len(cache.shared.entries), 2)
+        self.assertEqual(cache.stats()['a:0']['evictions'], 1)
+        self.assertEqual(cache.get('a:0'), 0)
+        self.forget_l1()
+        cache = self.make_cache(L1_MAX_BYTES=100)
+        cache.set('a:big', 'x' * 200)
+        self.assertEqual(len(cache.shared.entries), 0)
+        self.assertEqual(cache.get('a:big'), 'x' * 200)
+
+    def test_write_in_other_worker_invalidates_l1(self):
+        self.cache.set('a:b', 'old')
+        self.cache.set('c:d', 'untouched')
+        tiercache._sync_all()
+        self.in_other_worker(set_value, 'a:b', 'new')
+        # До синхронизации версий воркер видит свою копию.
+        self.assertEqual(self.cache.get('a:b'), 'old')
+        tiercache._sync_all()
+        self.assertEqual(self.cache.get('a:b'), 'new')
+        self.assertEqual(self.cache.stats()['c:d']['l1_hits'], 0)
+        self.cache.get('c:d')
+        self.assertEqual(self.cache.stats()['c:d']['l1_hits'], 1)
+
+    def test_incr_is_atomic_across_workers(self):
+        self.cache.set('a:counter', 0)
+        self.in_other_worker(increment, 'a:counter', 50, processes=4)
+        tiercache._sync_all()
+        self.assertEqual(self.cache.get('a:counter'), 200)
+
+    def test_add_is_a_lock_across_workers(self):
+        self.assertTrue(self.cache.add('a:lock', 1))
+        self.in_other_worker(expect_locked, 'a:lock')
+
+    def test_store_is_culled(self):
+        cache = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        for number in range(tiercache.CULL_EVERY):
+            cache.set(f'a:{number}', number)
+        rows = cache.shared.store.connection().execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+        self.assertEqual(rows, tiercache.CULL_EVERY // 2)
+
+    def test_pickled_size_counts_against_l1(self):
+        cache = self.make_cache()
+        cache.set('a:b', 'x' * 10)
+        self.assertEqual(cache.shared.size,
+                         len(pickle.dumps('x' * 10, cache.pickle_protocol)))
+
+
+def set_value(location, key, value):
+    tiercache._shared.pop(location, None)
+    tiercache.TieredCache(location, {}).set(key, value)
+
+
+def increment(location, key, times):
+    tiercache._shared.pop(location, None)
+    cache = tiercache.TieredCache(location, {})
+    for _ in range(times):
+        cache.incr(key)
+
+
+def expect_locked(location, key):
+    tiercache._shared.pop(location, None)
+    if tiercache.TieredCache(location, {}).add(key, 2):
+        os._exit(1)
+
+    def test_isolated_cache_is_a_temporary_file(self):
+        """Тесты не пишут в кеш сервера и не стирают его."""
+        server = os.path.join(settings.BASE_DIR, 'cache.sqlite3')
+        self.assertNotEqual(cache.shared.store.path, server)
+        outer = cache.shared.store.path
+        with tiercache.isolated():
+            cache.set('isolated', 1)
+            inner = cache.shared.store.path
+            self.assertNotEqual(inner, outer)
+        self.assertIsNone(cache.get('isolated'))
+        self.assertFalse(os.path.exists(inner))
@@ -0,0 +1,83 @@
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry
+
+backfill_migration = import_module('posts.migrations.0016_backfill_timelines')
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.old_post = Post.objects.create(text='До подписки',
+                                           author=cls.author)
+        Post.objects.create(text='Чужой пост', author=cls.stranger)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def timeline_posts(self):
+        return list(TimelineEntry.objects.filter(user=self.reader)
+                    .values_list('post_id', flat=True))
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        """Подписка дописывает старые посты, новые приходят сразу."""
+        self.client.get(reverse('profile_follow',
+                                kwargs={'username': self.author.username}))
+        self.assertEqual(self.timeline_posts(), [self.old_post.pk])
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']),
+                         [post, self.old_post])
+
+    def test_unfollow_removes_author_posts(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(reverse('profile_unfollow',
+                                kwargs={'username': self.author.username}))
+        self.assertEqual(self.timeline_posts(), [])
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_timeline_is_capped(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(3)]
+        self.assertEqual(self.timeline_posts(),
+                         [posts[2].pk, posts[1].pk])
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_fan_out_trims_every_follower(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.stranger, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(3)]
+        for user in (self.reader, self.stranger):
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    list(TimelineEntry.objects.filter(user=user)
+                         .values_list('post_id', flat=True)),
+                    [posts[2].pk, posts[1].pk])
+
+    def test_migration_fills_existing_follows(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        backfill_migration.fill_timelines(apps, None)
+        self.assertEqual(self.timeline_posts(), [self.old_post.pk])
+
+    def test_rebuild_command_restores_timeline(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', self.reader.username,
+                     stdout=StringIO())
+        self.assertEqual(self.timeline_posts(), [self.old_post.pk])
@@ -0,0 +1,170 @@
+"""Картинки постов, подготовленные при сохранении.
+
+При загрузке оригинал пересжимается без метаданных (EXIF с геометкой,
+комментарии), а из него режутся варианты карточки 960x339 нескольких
+ширин в AVIF, WebP и JPEG. Список вариантов (манифест) хранится в
+``Post.image_variants``, и ``post_item.html`` отдаёт его браузеру через
+``srcset``/``sizes``: телефон качает ширину под свой экран и формат,
+который умеет.
+
+Рендер ленты не открывает картинки и не ходит в хранилище ключей
+sorl-thumbnail. Варианты собираются в ``PostForm.save`` через
+``blobs.prepare`` — при создании и редактировании поста, для старых
+постов — командой ``manage.py generate_thumbnails``.
+
+Карточка режется через Pillow так же, как тег
+``{% thumbnail post.image "960x339" crop="center" upscale=True %}``:
+по центру, с увеличением маленьких оригиналов.
+"""
+import json
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Размер карточки поста в ленте и на странице поста.
+CARD_SIZE = (960, 339)
+# Ширины вариантов: от телефона до двойной плотности на десктопе.
+WIDTHS = (320, 480, 720, 960, 1440)
+# Форматы от самого компактного к самому совместимому. Формат, который
+# не умеет установленный Pillow, пропускается.
+FORMATS = (
+    ('AVIF', 'avif', 'image/avif', {'quality': 50}),
+    ('WEBP', 'webp', 'image/webp', {'quality': 80, 'method': 6}),
+    ('JPEG', 'jpg', 'image/jpeg', {'quality': 85, 'optimize': True,
+                                   'progressive': True}),
+)
+ORIGINAL_QUALITY = 90
+
+# Размеры оригинала и заглушка — доминирующий цвет, которым карточка
+# закрашена, пока грузится картинка.
+DESCRIPTION_FIELDS = ('image_width', 'image_height', 'image_color')
+EMPTY_DESCRIPTION = {'image_width': None, 'image_height': None,
+                     'image_color': ''}
+PALETTE_SIZE = 5
+
+FIELDS = ('thumbnail_url', 'thumbnail_width', 'thumbnail_height',
+          'image_variants') + DESCRIPTION_FIELDS
+
+
+def available_formats():
+    Image.init()
+    return [fmt for fmt in FORMATS if fmt[0] in Image.SAVE]
+
+
+def variant_name(image_name, size, extension):
+    stem = os.path.splitext(image_name)[0]
+    return f'thumbnails/{size[0]}x{size[1]}/{stem}.{extension}'
+
+
+def _encode(image, pil_format, options):
+    content = BytesIO()
+    # Параметры exif/icc_profile не передаются: метаданные не пишутся.
+    image.save(content, pil_format, **options)
+    return ContentFile(content.getvalue())
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+
+
+def clean_original(image):
+    """Пересжатый оригинал без метаданных: имя и содержимое.
+
+    Прозрачные картинки сохраняются в PNG, остальные — в JPEG.
+    """
+    with image.open('rb'), Image.open(image) as original:
+        upright = ImageOps.exif_transpose(original)
+        if _has_alpha(upright):
+            content = _encode(upright.convert('RGBA'), 'PNG',
+                              {'optimize': True})
+            extension = 'png'
+        else:
+            content = _encode(upright.convert('RGB'), 'JPEG',
+                              {'quality': ORIGINAL_QUALITY,
+                               'optimize': True})
+            extension = 'jpg'
+    stem = os.path.splitext(os.path.basename(image.name))[0]
+    return f'{stem}.{extension}', content
+
+
+def render_variants(image):
+    """Сохраняет варианты карточки; возвращает их список для манифеста."""
+    with image.open('rb'), Image.open(image) as original:
+        upright = ImageOps.exif_transpose(original).convert('RGB')
+    variants = []
+    for width in WIDTHS:
+        size = (width, round(width * CARD_SIZE[1] / CARD_SIZE[0]))
+        fitted = ImageOps.fit(upright, size, Image.LANCZOS)
+        for pil_format, extension, mime, options in available_formats():
+            name = variant_name(image.name, size, extension)
+            # Иначе хранилище добавит к имени суффикс, а старый файл
+            # останется лежать.
+            default_storage.delete(name)
+            name = default_storage.save(name,
+                                        _encode(fitted, pil_format, options))
+            variants.append({'type': mime, 'width': size[0],
+                             'height': size[1], 'name': name,
+                             'url': default_storage.url(name)})
+    return variants
+
+
+def describe(image):
+    """Размеры оригинала и его доминирующий цвет ``#rrggbb``."""
+    with image.open('rb'), Image.open(image) as original:
+        upright = ImageOps.exif_transpose(original).convert('RGB')
+    width, height = upright.size
+    upright.thumbnail((64, 64))
+    palette = upright.quantize(colors=PALETTE_SIZE)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    return {'image_width': width, 'image_height': height,
+            'image_color': f'#{red:02x}{green:02x}{blue:02x}'}
+
+
+def manifest(text):
+    """Разобранный манифест; пустой или испорченный — пустой список."""
+    try:
+        variants = json.loads(text)
+    except ValueError:
+        return []
+    return variants if isinstance(variants, list) else []
+
+
+def delete_variants(text):
+    """Удаляет файлы вариантов из манифеста ``text``."""
+    for variant in manifest(text):
+        if variant.get('name'):
+            default_storage.delete(variant['name'])
+
+
+def sources(text):
+    """``<source>`` для ``<picture>``: тип и srcset в порядке FORMATS."""
+    variants = manifest(text)
+    result = []
+    for _, _, mime, _ in FORMATS:
+        srcset = ', '.join(f'{variant["url"]} {variant["width"]}w'
+                           for variant in variants
+                           if variant['type'] == mime)
+        if srcset:
+            result.append({'type': mime, 'srcset': srcset})
+    return result
+
+
+def apply(post, text, description):
+    """Записывает в поля поста манифест ``text``, запасную картинку и
+    описание оригинала из ``describe``.
+    """
+    fallback = next(
+        (variant for variant in manifest(text)
+         if variant['type'] == 'image/jpeg'
+         and variant['width'] == CARD_SIZE[0]), None)
+    post.image_variants = text if fallback else ''
+    post.thumbnail_url = fallback['url'] if fallback else ''
+    post.thumbnail_width = fallback['width'] if fallback else None
+    post.thumbnail_height = fallback['height'] if fallback else None
+    for field in DESCRIPTION_FIELDS:
+        setattr(post, field, description[field])
@@ -0,0 +1,422 @@
+"""Двухуровневый кеш: LRU в памяти процесса перед общим файлом SQLite.
+
+L1 — словарь в памяти воркера, ограниченный числом записей, объёмом и
+временем жизни (``L1_MAX_ENTRIES``, ``L1_MAX_BYTES``, ``L1_TIMEOUT``).
+L2 — файл SQLite (``LOCATION``), общий для всех воркеров машины; внешних
+служб не нужно. Атомарные ``add`` и ``incr`` (блокировки и счётчики
+поколений ``pagecache``) выполняются в L2 транзакцией ``BEGIN
+IMMEDIATE``.
+
+Инвалидация между воркерами — через ключи версий. Ключи делятся на
+префиксы по первым ``PREFIX_DEPTH`` частям через двоеточие
+(``pages:generation``, ``pages:index``...). Любая запись в L2 той же
+транзакцией увеличивает версию своего префикса. Запись L1 помнит версию
+префикса, при которой прочитана, и не годится, если версия с тех пор
+сменилась. Версии всех префиксов читаются из L2 одним запросом в начале
+каждого HTTP-запроса и не реже раза в ``SYNC_INTERVAL`` секунд.
+
+Счётчики попаданий, промахов и вытеснений ведутся по префиксам в памяти
+процесса (``stats()``) и выводятся на ``/metrics/``.
+
+Тесты и бенчмарки работают с кешем во временном файле (``isolated()``):
+общий файл сервера они не читают и не стирают.
+"""
+import copy
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.signals import request_started
+from django.test.utils import override_settings
+
+STAT_EVENTS = ('l1_hits', 'l2_hits', 'misses', 'sets', 'evictions')
+# Раз в сколько записей процесс проверяет размер L2.
+CULL_EVERY = 100
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE TABLE IF NOT EXISTS versions ('
+    'prefix TEXT PRIMARY KEY, version INTEGER NOT NULL)',
+)
+
+# Общее на процесс состояние по LOCATION: Django создаёт экземпляр
+# бэкенда на каждый поток.
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+class SharedStore:
+    """L2 в файле SQLite: соединение на поток, заново после fork."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def connection(self):
+        local = self.local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            # Кеш можно потерять при сбое питания: fsync не нужен.
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def read(self, keys):
+        """``{ключ: (значение, срок)}`` для живых ключей из ``keys``."""
+        now = time.time()
+        found = {}
+        keys = list(keys)
+        # Не больше 500 параметров на запрос: предел SQLite.
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.connection().execute(
+                'SELECT key, value, expires FROM cache WHERE key IN ({})'
+                .format(', '.join('?' * len(chunk))), chunk)
+            for key, value, expires in rows:
+                if expires is None or expires > now:
+                    found[key] = (value, expires)
+        return found
+
+    def versions(self):
+        return dict(self.connection().execute(
+            'SELECT prefix, version FROM versions'))
+
+    def write(self, change):
+        """Выполняет ``change(connection)`` в транзакции BEGIN IMMEDIATE.
+
+        Транзакция берёт блокировку записи сразу, поэтому чтение и запись
+        внутри неё атомарны для всех процессов.
+        """
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = change(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+
+class Shared:
+    """L1, версии префиксов и счётчики одного LOCATION в процессе."""
+
+    def __init__(self, path):
+        self.store = SharedStore(path)
+        # Повторно входимая: счётчики обновляются и под блокировкой L1.
+        self.lock = threading.RLock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.versions = {}
+        self.synced = 0.0
+        self.writes = 0
+        self.stats = defaultdict(lambda: dict.fromkeys(STAT_EVENTS, 0))
+
+    def sync(self):
+        versions = self.store.versions()
+        with self.lock:
+            self.versions = versions
+            self.synced = time.monotonic()
+
+
+def _sync_all(**kwargs):
+    for shared in list(_shared.values()):
+        shared.sync()
+
+
+request_started.connect(_sync_all, dispatch_uid='tiercache_sync')
+
+
+@contextmanager
+def isolated(alias='default'):
+    """Кеш ``alias`` во временном файле на время блока."""
+    directory = tempfile.mkdtemp()
+    location = os.path.join(directory, 'cache.sqlite3')
+    caches = copy.deepcopy(settings.CACHES)
+    caches[alias]['LOCATION'] = location
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        with _shared_lock:
+            _shared.pop(location, None)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TieredCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l1_max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self.l1_max_bytes = options.get('L1_MAX_BYTES', 16 * 2 ** 20)
+        self.l1_timeout = options.get('L1_TIMEOUT', 60)
+        self.prefix_depth = options.get('PREFIX_DEPTH', 2)
+        self.sync_interval = options.get('SYNC_INTERVAL', 1.0)
+        with _shared_lock:
+            if location not in _shared:
+                _shared[location] = Shared(location)
+            self.shared = _shared[location]
+
+    def prefix(self, key):
+        """Префикс ключа для версий и статистики — без KEY_PREFIX и версии."""
+        return ':'.join(key.split(':')[:self.prefix_depth])
+
+    def _key(self, key, version):
+        made = self.make_key(key, version=version)
+        self.validate_key(made)
+        return made
+
+    def _count(self, prefix, event):
+        with self.shared.lock:
+            self.shared.stats[prefix][event] += 1
+
+    def _maybe_sync(self):
+        if time.monotonic() - self.shared.synced >= self.sync_interval:
+            self.shared.sync()
+
+    # L1
+
+    def _l1_get(self, made, prefix):
+        shared = self.shared
+        with shared.lock:
+            entry = shared.entries.get(made)
+            if entry is None:
+                return None
+            pickled, deadline, version, _ = entry
+            if (deadline <= time.time()
+                    or version != shared.versions.get(prefix)):
+                self._l1_drop(made)
+                return None
+            shared.entries.move_to_end(made)
+            return pickled
+
+    def _l1_put(self, made, prefix, pickled, expires):
+        """Кладёт значение в L1; ``expires`` — срок из L2 или ``None``."""
+        if len(pickled) > self.l1_max_bytes:
+            return
+        deadline = time.time() + self.l1_timeout
+        if expires is not None:
+            deadline = min(deadline, expires)
+        shared = self.shared
+        with shared.lock:
+            self._l1_drop(made)
+            shared.entries[made] = (pickled, deadline,
+                                    shared.versions.get(prefix), prefix)
+            shared.size += len(pickled)
+            while (len(shared.entries) > self.l1_max_entries
+                   or shared.size > self.l1_max_bytes):
+                _, (evicted, _, _, evicted_prefix) = (
+                    shared.entries.popitem(last=False))
+                shared.size -= len(evicted)
+                shared.stats[evicted_prefix]['evictions'] += 1
+
+    def _l1_drop(self, made):
+        entry = self.shared.entries.pop(made, None)
+        if entry is not None:
+            self.shared.size -= len(entry[0])
+
+    # L2
+
+    def _bump(self, connection, prefixes):
+        """Увеличивает версии префиксов; возвращает новые значения."""
+        versions = {}
+        for prefix in set(prefixes):
+            connection.execute(
+                'INSERT INTO versions (prefix, version) VALUES (?, 1) '
+                'ON CONFLICT (prefix) DO UPDATE SET version = version + 1',
+                (prefix,))
+            versions[prefix] = connection.execute(
+                'SELECT version FROM versions WHERE prefix = ?',
+                (prefix,)).fetchone()[0]
+        return versions
+
+    def _wrote(self, versions, stored=()):
+        """Обновляет версии процесса и L1 после записи в L2."""
+        shared = self.shared
+        with shared.lock:
+            shared.versions.update(versions)
+            shared.writes += 1
+            cull = shared.writes % CULL_EVERY == 0
+        for made, prefix, pickled, expires in stored:
+            self._l1_put(made, prefix, pickled, expires)
+            self._count(prefix, 'sets')
+        if cull:
+            self._cull()
+
+    def _cull(self):
+        def change(connection):
+            connection.execute('DELETE FROM cache WHERE expires <= ?',
+                               (time.time(),))
+            total = connection.execute(
+                'SELECT COUNT(*) FROM cache').fetchone()[0]
+            if total > self._max_entries:
+                connection.execute(
+                    'DELETE FROM cache WHERE rowid IN (SELECT rowid FROM '
+                    'cache ORDER BY rowid LIMIT ?)',
+                    (total // self._cull_frequency,))
+        self.shared.store.write(change)
+
+    # API Django
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        self._maybe_sync()
+        made = {self._key(key, version): key for key in keys}
+        found, missing = {}, {}
+        for made_key, key in made.items():
+            prefix = self.prefix(key)
+            pickled = self._l1_get(made_key, prefix)
+            if pickled is not None:
+                self._count(prefix, 'l1_hits')
+                found[key] = pickle.loads(pickled)
+            else:
+                missing[made_key] = key
+        if missing:
+            rows = self.shared.store.read(missing)
+            for made_key, key in missing.items():
+                prefix = self.prefix(key)
+                if made_key not in rows:
+                    self._count(prefix, 'misses')
+                    continue
+                pickled, expires = rows[made_key]
+                self._count(prefix, 'l2_hits')
+                self._l1_put(made_key, prefix, pickled, expires)
+                found[key] = pickle.loads(pickled)
+        return found
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [(self._key(key, version), self.prefix(key),
+                 pickle.dumps(value, self.pickle_protocol), expires)
+                for key, value in data.items()]
+
+        def change(connection):
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                [(made, pickled, deadline)
+                 for made, _, pickled, deadline in rows])
+            return self._bump(connection, [prefix for _, prefix, _, _ in rows])
+
+        if rows:
+            self._wrote(self.shared.store.write(change), rows)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made, prefix = self._key(key, version), self.prefix(key)
+        expires = self.get_backend_timeout(timeout)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+
+        def change(connection):
+            row = connection.execute(
+                'SELECT expires FROM cache WHERE key = ?', (made,)).fetchone()
+            if row is not None and (row[0] is None or row[0] > time.time()):
+                return None
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)', (made, pickled, expires))
+            return self._bump(connection, [prefix])
+
+        versions = self.shared.store.write(change)
+        if versions is None:
+            return False
+        self._wrote(versions, [(made, prefix, pickled, expires)])
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        made, prefix = self._key(key, version), self.prefix(key)
+
+        def change(connection):
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (made,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            pickled = pickle.dumps(value, self.pickle_protocol)
+            connection.execute('UPDATE cache SET value = ? WHERE key = ?',
+                               (pickled, made))
+            return value, pickled, row[1], self._bump(connection, [prefix])
+
+        value, pickled, expires, versions = self.shared.store.write(change)
+        self._wrote(versions, [(made, prefix, pickled, expires)])
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        made, prefix = self._key(key, version), self.prefix(key)
+        expires = self.get_backend_timeout(timeout)
+
+        def change(connection):
+            updated = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? AND '
+                '(expires IS NULL OR expires > ?)',
+                (expires, made, time.time())).rowcount
+            return self._bump(connection, [prefix]) if updated else None
+
+        versions = self.shared.store.write(change)
+        if versions is None:
+            return False
+        self._wrote(versions)
+        return True
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        made = {self._key(key, version): self.prefix(key) for key in keys}
+        if not made:
+            return
+
+        def change(connection):
+            connection.executemany('DELETE FROM cache WHERE key = ?',
+                                   [(key,) for key in made])
+            return self._bump(connection, made.values())
+
+        versions = self.shared.store.write(change)
+        with self.shared.lock:
+            for key in made:
+                self._l1_drop(key)
+        self._wrote(versions)
+
+    def clear(self):
+        def change(connection):
+            connection.execute('DELETE FROM cache')
+            # Версии не сбрасываются в ноль, иначе L1 других воркеров
+            # могли бы совпасть со старыми значениями.
+            connection.execute('UPDATE versions SET version = version + 1')
+
+        self.shared.store.write(change)
+        with self.shared.lock:
+            self.shared.entries.clear()
+            self.shared.size = 0
+        self.shared.sync()
+
+    def stats(self):
+        """Счётчики событий по префиксам ключей в этом процессе."""
+        with self.shared.lock:
+            return {prefix: dict(events)
+                    for prefix, events in sorted(self.shared.stats.items())}
@@ -0,0 +1,184 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, поэтому
+страница ``/follow/`` читает только ``TimelineEntry`` одного пользователя
+по индексу ``(user, -pub_date, -post)``. Длина ленты ограничена
+``TIMELINE_MAX_LENGTH`` записями — более старые посты из ленты уходят.
+
+Посты популярных авторов сюда не пишутся, их читает ``feed.HybridFeed``.
+Когда автор опускается ниже порога, его последние посты дописываются в
+ленты всех подписчиков командой ``sync_feed_modes`` (``sync_modes``), а не
+в запросе отписки: это до ``(FEED_PULL_THRESHOLD - 1) *
+TIMELINE_MAX_LENGTH`` строк.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+
+from .feed import forget_pulled, pulled_authors
+from .models import Follow, Post, TimelineEntry, UserStats
+
+BATCH_SIZE = 500
+# Сколько записей ``push_author`` пишет одной транзакцией.
+PUSH_ENTRIES = 20000
+
+# Записи за пределом длины ленты сразу у многих пользователей: одна
+# выборка по индексу (user, -pub_date, -post) вместо DELETE на каждого.
+TRIM_SQL = """
+    DELETE FROM {table} WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC
+            ) AS position
+            FROM {table} WHERE user_id IN ({users})
+        ) AS ranked WHERE position > %s
+    )"""
+
+
+def _entry(user_id, post):
+    return TimelineEntry(user_id=user_id, post_id=post.pk,
+                         author_id=post.author_id, pub_date=post.pub_date)
+
+
+def trim_many(user_ids):
+    """Удаляет из лент ``user_ids`` всё, что не помещается в
+    ``TIMELINE_MAX_LENGTH``."""
+    user_ids = list(user_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            batch = user_ids[start:start + BATCH_SIZE]
+            sql = TRIM_SQL.format(table=TimelineEntry._meta.db_table,
+                                  users=', '.join(['%s'] * len(batch)))
+            cursor.execute(sql, [*batch, settings.TIMELINE_MAX_LENGTH])
+
+
+def trim(user_id):
+    """Удаляет из ленты всё, что не помещается в ``TIMELINE_MAX_LENGTH``."""
+    trim_many([user_id])
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков его автора."""
+    if post.author_id in pulled_authors():
+        return
+    followers = (Follow.objects.filter(author_id=post.author_id)
+                 .values_list('user_id', flat=True).distinct())
+    entries = [_entry(user_id, post) for user_id in followers.iterator()]
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE,
+                                      ignore_conflicts=True)
+    trim_many(entry.user_id for entry in entries)
+
+
+def _latest_posts(author_id):
+    return (Post.objects.filter(author_id=author_id)
+            .order_by('-pub_date', '-pk')
+            .only('pk', 'author_id', 'pub_date')
+            [:settings.TIMELINE_MAX_LENGTH])
+
+
+def push_author(author_id):
+    """Дописывает последние посты автора в ленты всех его подписчиков.
+
+    Записи нескольких подписчиков пишутся одной пачкой и одной
+    транзакцией, не больше ``PUSH_ENTRIES`` записей.
+    """
+    posts = list(_latest_posts(author_id))
+    if not posts:
+        return
+    followers = list(Follow.objects.filter(author_id=author_id)
+                     .values_list('user_id', flat=True).distinct())
+    step = max(1, PUSH_ENTRIES // len(posts))
+    for start in range(0, len(followers), step):
+        batch = followers[start:start + step]
+        with transaction.atomic():
+            TimelineEntry.objects.bulk_create(
+                [_entry(user_id, post) for user_id in batch
+                 for post in posts],
+                batch_size=BATCH_SIZE, ignore_conflicts=True)
+            trim_many(batch)
+
+
+def follower_added(author_id):
+    """Переводит автора в pull-режим, если подписчиков стало не меньше
+    ``FEED_PULL_THRESHOLD``.
+
+    Сравнивается счётчик после подписки, а не равенство порогу: параллельные
+    подписки не проскочат переход.
+    """
+    marked = UserStats.objects.filter(
+        user_id=author_id, feed_pulled=False,
+        followers_count__gte=settings.FEED_PULL_THRESHOLD,
+    ).update(feed_pulled=True)
+    if marked:
+        forget_pulled()
+
+
+def mark_pulled():
+    """Переводит в pull-режим всех, кто набрал порог; возвращает число."""
+    marked = UserStats.objects.filter(
+        feed_pulled=False, followers_count__gte=settings.FEED_PULL_THRESHOLD,
+    ).update(feed_pulled=True)
+    if marked:
+        forget_pulled()
+    return marked
+
+
+def _dropped():
+    return UserStats.objects.filter(
+        feed_pulled=True, followers_count__lt=settings.FEED_PULL_THRESHOLD)
+
+
+def sync_modes():
+    """Сверяет режимы авторов с порогом; возвращает ``(pulled, pushed)``.
+
+    Автору, опустившемуся ниже порога, посты сначала дописываются в ленты,
+    и только потом он перестаёт читаться в pull-режиме.
+    """
+    pulled = mark_pulled()
+    pushed = 0
+    for author_id in _dropped().values_list('user_id', flat=True):
+        push_author(author_id)
+        UserStats.objects.filter(user_id=author_id).update(
+            feed_pulled=False)
+        forget_pulled()
+        pushed += 1
+    return pulled, pushed
+
+
+def reset_modes():
+    """Режимы строго по порогу, без дописывания лент: для полной
+    пересборки, которая запишет ленты сама."""
+    mark_pulled()
+    if _dropped().update(feed_pulled=False):
+        forget_pulled()
+
+
+def backfill(user_id, author_id):
+    """Дописывает в ленту последние посты автора после подписки."""
+    if author_id in pulled_authors():
+        return
+    TimelineEntry.objects.bulk_create(
+        [_entry(user_id, post) for post in _latest_posts(author_id)],
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    trim(user_id)
+
+
+def remove_author(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново из таблицы подписок."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    followed = (Follow.objects.filter(user_id=user_id)
+                .values_list('author_id', flat=True))
+    pulled = pulled_authors().intersection(followed)
+    posts = (Post.objects.filter(author__following__user_id=user_id)
+             .exclude(author_id__in=pulled)
+             .order_by('-pub_date', '-pk')
+             .only('pk', 'author_id', 'pub_date')
+             .distinct()[:settings.TIMELINE_MAX_LENGTH])
+    TimelineEntry.objects.bulk_create(
+        [_entry(user_id, post) for post in posts],
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import metrics, views
 
 
 urlpatterns = [
@@ -8,6 +8,8 @@ urlpatterns = [
     path('404/', views.page_not_found, name='handler404'),
     path('500/', views.server_error, name='handler500'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('metrics/', metrics.metrics, name='metrics'),
+    path('search/', views.search, name='search'),
     path('<str:username>/follow/', views.profile_follow,
          name='profile_follow'),
     path('<str:username>/unfollow/', views.profile_unfollow,
@@ -1,18 +1,25 @@
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.models import User
-from django.core.paginator import Paginator
-from django.shortcuts import get_object_or_404, redirect, render
+from django.http import Http404
+from django.shortcuts import redirect, render
 
 from .forms import PostForm, CommentForm
 
 from .models import Group, Post, Comment, Follow
-
-
+from .counters import stats_for
+from . import objectcache
+from .feed import feed_page
+from .pagecache import (cache_feed_page, conditional_page, group_scope,
+                        profile_scope)
+from .paginator import paginate
+from .routers import use_primary
+from .search import search as search_posts
+
+
+@conditional_page(lambda: 'index')
+@cache_feed_page(lambda: 'index')
 def index(request):
-    latest = Post.objects.all()
-    paginator = Paginator(latest, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    latest = Post.objects.for_feed()
+    page = paginate(request, latest)
     return render(
         request,
         'index.html',
@@ -20,17 +27,45 @@ def index(request):
     )
 
 
+@conditional_page(group_scope)
+@cache_feed_page(group_scope)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    group = objectcache.groups.get_or_404(slug)
+    posts = group.posts.for_feed()
+    page = paginate(request, posts)
 
     return render(request, 'group.html',
                   {'page': page, 'group': group, 'posts': posts})
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    group_slug = request.GET.get('group', '')
+    author_name = request.GET.get('author', '')
+    group = author = None
+    if group_slug:
+        group = objectcache.groups.get(group_slug)
+    if author_name:
+        author = objectcache.users.get(author_name)
+    results, next_cursor = [], None
+    # Неизвестная группа или автор в фильтре — пустая выдача.
+    if (group or not group_slug) and (author or not author_name):
+        results, next_cursor = search_posts(
+            query,
+            group_id=group.pk if group else None,
+            author_id=author.pk if author else None,
+            cursor=request.GET.get('cursor'))
+    next_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_query = params.urlencode()
+    return render(request, 'search.html',
+                  {'query': query, 'results': results, 'group': group,
+                   'author': author, 'groups': Group.objects.order_by('title'),
+                   'next_query': next_query})
+
+
 @login_required
 def new_post(request):
     form = PostForm(request.POST or None,
@@ -46,31 +81,38 @@ def new_post(request):
     return render(request, 'new.html', {'form': form})
 
 
+@conditional_page(profile_scope)
+@cache_feed_page(profile_scope)
 def profile(request, username):
-    profile = get_object_or_404(User, username=username)
-    post_list = profile.posts.all()
-    counter_post = post_list.count()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    profile = objectcache.users.get_or_404(username)
+    stats = stats_for(profile)
+    post_list = profile.posts.for_feed()
+    counter_post = stats.posts_count
+    page = paginate(request, post_list)
     following = (request.user.is_authenticated and
                  Follow.objects.filter(user=request.user,
                                        author=profile).exists())
 
     return render(request, 'profile.html',
                   {'profile': profile, 'counter_post': counter_post,
-                   'page': page,
+                   'stats': stats, 'page': page,
                    'following': following})
 
 
+# Пост, его комментарии и карточка автора сбрасывают область профиля.
+@conditional_page(lambda username, post_id: profile_scope(username))
 def post_view(request, username, post_id):
-    profile = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, id=post_id)
-    comments = Comment.objects.filter(post=post)
+    profile = objectcache.users.get_or_404(username)
+    post = objectcache.posts.get_or_404(post_id)
+    if post.author_id == profile.pk:
+        post.author = profile
+    comments = (Comment.objects.filter(post=post).select_related('author')
+                .order_by('created'))
     form = CommentForm()
     context = {
         'post': post,
         'profile': profile,
+        'stats': stats_for(profile),
         'comments': comments,
         'form': form,
     }
@@ -78,14 +120,18 @@ def post_view(request, username, post_id):
 
 
 @login_required
+@use_primary
 def post_edit(request, username, post_id):
-    post = get_object_or_404(Post, id=post_id, author=request.user)
+    post = objectcache.posts.get_or_404(post_id)
+    if post.author_id != request.user.pk:
+        raise Http404
     form = PostForm(request.POST or None,
                     files=request.FILES or None, instance=post)
     if request.method == 'POST':
         if form.is_valid():
             form.save()
-        return redirect('post', username=post.author.username, post_id=post.id)
+        return redirect('post', username=request.user.username,
+                        post_id=post.id)
 
     return render(request, 'new.html', {'form': form, 'post': post})
 
@@ -106,7 +152,9 @@ def server_error(request):
 @login_required
 def add_comment(request, username, post_id):
     form = CommentForm(request.POST or None)
-    post = get_object_or_404(Post, id=post_id, author=request.user)
+    post = objectcache.posts.get_or_404(post_id)
+    if post.author_id != request.user.pk:
+        raise Http404
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
@@ -118,18 +166,15 @@ def add_comment(request, username, post_id):
 @login_required
 def follow_index(request):
     """Страница постов подписанных авторов."""
-    post_follower = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_follower, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = feed_page(request, request.user)
     return render(request, 'follow.html',
-                  {'page': page, 'paginator': paginator})
+                  {'page': page, 'paginator': page.paginator})
 
 
 @login_required
 def profile_follow(request, username):
     """Подписка на автора."""
-    author = get_object_or_404(User, username=username)
+    author = objectcache.users.get_or_404(username)
     if request.user != author:
         Follow.objects.get_or_create(user_id=request.user.id,
                                      author_id=author.id)
@@ -139,7 +184,7 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     """Отписка от автора."""
-    author = get_object_or_404(User, username=username)
+    author = objectcache.users.get_or_404(username)
     follow = Follow.objects.filter(user_id=request.user.id,
                                    author_id=author.id)
     follow.delete()
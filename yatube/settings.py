@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.metrics.MetricsMiddleware',
+    'posts.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,7 +96,34 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # Постоянные соединения; перед запросом — проверка, см. posts/db.py.
+        'CONN_MAX_AGE': 600,
+    },
+    # Локальная копия для чтения (manage.py sync_replica); в тестах —
+    # зеркало default.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+# Псевдонимы реплик для чтения, например ['replica']; пусто — всё в
+# default. См. posts/routers.py.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['posts.routers.PrimaryReplicaRouter']
+# Сколько секунд после записи читать с основной базы: автору запроса и
+# страницам изменённых областей.
+REPLICA_STICKY_SECONDS = 5
+# PRAGMA каждого нового соединения SQLite.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 2 ** 20,
+    # Отрицательное значение — в КиБ: 64 МиБ.
+    'cache_size': -64 * 2 ** 10,
+    'temp_store': 'memory',
 }
 
 
@@ -116,6 +145,11 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Сессия и пользователь сессии читаются из кеша, база — при промахе.
+# См. posts/sessions.py и posts/backends.py.
+SESSION_ENGINE = 'posts.sessions'
+AUTHENTICATION_BACKENDS = ['posts.backends.CachedModelBackend']
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
@@ -140,6 +174,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Хеш загрузки считается при приёме, см. posts/storage.py.
+FILE_UPLOAD_HANDLERS = [
+    'posts.storage.HashingMemoryFileUploadHandler',
+    'posts.storage.HashingTemporaryFileUploadHandler',
+]
+
 
 # Login
 
@@ -149,8 +189,72 @@ LOGOUT_REDIRECT_URL = "index"
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
+# L1 в памяти воркера перед общим для воркеров файлом SQLite, см.
+# posts/tiercache.py. Тесты получают свой временный файл (TEST_RUNNER,
+# conftest.py).
+TEST_RUNNER = 'yatube.test_runner.TestRunner'
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'posts.tiercache.TieredCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'L1_MAX_ENTRIES': 1000,
+            'L1_MAX_BYTES': 16 * 2 ** 20,
+            'L1_TIMEOUT': 60,
+            'SYNC_INTERVAL': 1,
+        },
     }
 }
+
+# Posts
+
+POSTS_PER_PAGE = 10
+# Сколько строк максимум считает нумерованный пагинатор; дальше — курсор.
+PAGINATOR_COUNT_LIMIT = 200
+# То же для списков админки; дальше число строк оценивается.
+ADMIN_COUNT_LIMIT = 10000
+# Сколько последних постов хранится в материализованной ленте подписок.
+TIMELINE_MAX_LENGTH = 800
+# С какого числа подписчиков посты автора читаются в ленту при показе
+# (pull), а не раскладываются по лентам при публикации (push).
+FEED_PULL_THRESHOLD = 1000
+FEED_PULL_REFRESH = 60
+# Время жизни страниц лент в кеше; сброс — по сигналам записи.
+PAGE_CACHE_TIMEOUT = 60 * 15
+# Сколько ещё после истечения можно отдавать устаревшую копию, пока
+# один воркер собирает страницу заново.
+PAGE_CACHE_STALE_TIMEOUT = 60 * 60
+PAGE_CACHE_LOCK_TIMEOUT = 30
+# Сколько ждать чужой сборки, если устаревшей копии нет.
+PAGE_CACHE_LOCK_WAIT = 2
+PAGE_CACHE_EARLY_BETA = 1.0
+# Кеш объектов из адресов (posts/objectcache.py): найденные живут до
+# сброса сигналом, отсутствующие — недолго.
+OBJECT_CACHE_TIMEOUT = 60 * 60
+OBJECT_CACHE_NEGATIVE_TIMEOUT = 30
+# Бюджеты на запрос по именам URL: число SQL-запросов и секунды
+# (sql, template, latency). Превышения пишутся в лог yatube.metrics.
+METRICS_BUDGETS = {
+    'default': {'queries': 20, 'latency': 1.0},
+    'index': {'queries': 8},
+    'group': {'queries': 8},
+    'profile': {'queries': 10},
+    'post': {'queries': 10},
+    'follow_index': {'queries': 10},
+    'search': {'queries': 8},
+    # JSON API: сессия и пользователь при промахе кеша — два запроса
+    # из бюджета.
+    'api_posts': {'queries': 3},
+    'api_post': {'queries': 4},
+    'api_comments': {'queries': 5},
+    'api_groups': {'queries': 3},
+    'api_group': {'queries': 3},
+    'api_group_posts': {'queries': 4},
+    'api_profile': {'queries': 3},
+    'api_profile_posts': {'queries': 4},
+    'api_feed': {'queries': 8},
+}
+# Поиск по индексу SQLite FTS5; False — запасной индекс на Python.
+SEARCH_FTS5 = True
@@ -0,0 +1,18 @@
+from contextlib import ExitStack
+
+from django.test.runner import DiscoverRunner
+
+from posts import tiercache
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты со своим кешем, а не с общим файлом запущенного сервера."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_stack = ExitStack()
+        self.cache_stack.enter_context(tiercache.isolated())
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_stack.close()
+        super().teardown_test_environment(**kwargs)